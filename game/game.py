@@ -1,71 +1,80 @@
-import re
+import os
 import json
-import sqlite3
+import hashlib
+import threading
 import numpy as np
-from flask import g
 from flask import Flask
+from flask import abort
+from flask import make_response
 from flask import render_template
 from flask import request
+from flask import session
+from flask import send_from_directory
+
+from predictor import BatchPredictor
+from speech_cache import SpeechCache
+from game_stats import GameStats
 
 app = Flask(__name__)
+MODEL_FILE = os.path.join(app.root_path, "..", "model_files", "final_model.npz")
+
+# Paragraphs, labels, contributions and coefficients are served from memory.
+# SPEECH_CACHE_SIZE bounds the number of speeches kept at once.
+app.config.setdefault("SPEECH_CACHE_SIZE", 256)
+DATA_DIR = os.path.dirname(os.path.abspath('data.db'))
+speech_cache = SpeechCache('data.db', app.config["SPEECH_CACHE_SIZE"], 
+                           os.path.join(DATA_DIR, "contribs"))
 
-def get_db():
-    db = getattr(g, '_database', None)
-    if db is None:
-        db = g._database = sqlite3.connect('data.db')
-    return db
-
-@app.teardown_appcontext
-def close_connection(exception):
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
-
-def query_db(query, args=(), tups=True):
-    cur = get_db().execute(query, args)
-    fetched = cur.fetchall()
-    cur.close()
-    if tups: 
-        return fetched
-    else: 
-        return [tup[0] for tup in fetched]
-
-with app.app_context():
-    speech_ids = query_db("SELECT DISTINCT speech_id FROM paragraphs", tups=False)
-
-num_total = 0
-num_correct = 0
+# The computer's record across all players is shared by every worker through stats.db,
+#   while each player's own record is kept in their session. Sessions are signed with
+#   GAME_SECRET_KEY, which must be set when running more than one worker process.
+game_stats = GameStats(os.environ.get("GAME_STATS_DB", "stats.db"))
+app.secret_key = os.environ.get("GAME_SECRET_KEY") or os.urandom(24)
 
 @app.route('/')
 def reset():
-    speech_id = np.random.choice(speech_ids)
-
-    command = "SELECT par FROM paragraphs WHERE speech_id=? ORDER BY par_id"
-    pars = query_db(command, (speech_id,), tups=False)
-
-    command = "SELECT predicted, observed FROM paragraphs WHERE speech_id=? LIMIT 1"
-    pred, obs = query_db(command, (speech_id,))[0]
+    speech = speech_cache.get_speech(np.random.choice(speech_cache.get_speech_ids()))
+    correct = speech["predicted"] == speech["observed"]
 
-    global num_total 
-    global num_correct 
-    num_total += 1
-    if pred == obs:
-        num_correct += 1
+    num_total, num_correct = game_stats.record(correct)
+    session["num_total"] = session.get("num_total", 0) + 1
+    session["num_correct"] = session.get("num_correct", 0) + int(correct)
 
-    command = "SELECT COUNT(*) FROM contribs WHERE speech_id=?"
-    num_contributors = query_db(command, (speech_id,), tups=False)[0]
+    return render_game(
+        speech,
+        num_correct = num_correct, 
+        num_total = num_total,
+        session_correct = session["num_correct"],
+        session_total = session["num_total"]
+    )
 
+def render_game(speech, **scores):
     return render_template(
         'game.html', 
-        speech_id=speech_id,
-        pars=pars, 
-        predicted=pred, 
-        observed=obs, 
-        num_correct = num_correct, 
-        num_total = num_total,
-        num_contributors = num_contributors
+        speech_id=speech["id"],
+        body=speech["body"], 
+        predicted=speech["predicted"], 
+        observed=speech["observed"], 
+        num_contributors=speech["num_contributors"],
+        **scores
     )
 
+# Shows a particular speech without counting it as a game. The page depends only on
+#   the speech, so it is rendered once, kept with the cached speech, and revalidated 
+#   by browsers with its ETag.
+@app.route('/speech/<int:speech_id>')
+def show_speech(speech_id):
+    speech = speech_cache.get_speech(speech_id)
+    if speech is None:
+        abort(404)
+    if "page" not in speech:
+        page = render_game(speech, num_total=None)
+        speech["etag"] = hashlib.sha1(page.encode("utf-8")).hexdigest()
+        speech["page"] = page
+    response = make_response(speech["page"])
+    response.set_etag(speech["etag"])
+    return response.make_conditional(request)
+
 @app.route('/details/')
 def details():
     return render_template("details.html")
@@ -80,36 +89,9 @@ def get_values():
     lower = request.args.get('from', 1)
     upper = request.args.get('to', 50)
     
-    type_dict = {
-        'all': ['word', 'pos', 'intercept'],
-        'word': ['word', '', ''],
-        'pos': ['pos', '', '']
-    }
-    if table == "contribs":
-        args = tuple([speech_id] + type_dict[feature_type])
-        command = " ".join(["SELECT long_name, value FROM contribs", 
-                            "WHERE speech_id=? AND feature_type IN (?, ?, ?)"])
-        results = query_db(command, args)
-    else:
-        args = tuple(type_dict[feature_type])
-        command = "SELECT long_name, value FROM coefs WHERE feature_type IN (?, ?, ?)"
-        results = query_db(command, args)
-
-    value_pairs = [value_pair for value_pair in results
-                   if re.search(search, value_pair[0].split(":")[-1], flags = re.IGNORECASE)]
-
-    orderDict = {
-        "descMag": {"key": lambda pair: abs(pair[1]), 
-                    "reverse":  True },
-        "ascMag": {"key": lambda pair: abs(pair[1]), 
-                    "reverse":  False },
-        "descVal": {"key": lambda pair: pair[1], 
-                    "reverse":  True},
-        "ascVal": {"key": lambda pair: pair[1], 
-                    "reverse":  False}
-    }
-    value_pairs.sort(**orderDict[order])
-    final_value_pairs = value_pairs[int(lower)-1:int(upper)]
+    final_value_pairs = speech_cache.get_values(
+        speech_id if table == "contribs" else None,
+        feature_type, search, order, int(lower), int(upper))
 
     for_json = {
         "feature_names":[value_pair[0] for value_pair in final_value_pairs],
@@ -123,6 +105,48 @@ def get_values():
 
     return json.dumps(for_json)
 
+# Serves the gzip'd JSON written by populate_game_database.py from the version of the
+#   contribution arrays that data.db points to. Responses carry an ETag, so browsers
+#   revalidate instead of downloading a snapshot again.
+@app.route('/snapshots/<name>')
+def get_snapshot(name):
+    snapshot_dir = speech_cache.get_snapshot_dir()
+    if snapshot_dir is None:
+        abort(404)
+    response = send_from_directory(snapshot_dir, name, mimetype="application/json")
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+# The model is loaded once per worker process, on the first prediction request.
+predictor = None
+predictor_lock = threading.Lock()
+
+def get_predictor():
+    global predictor
+    with predictor_lock:
+        if predictor is None:
+            predictor = BatchPredictor(MODEL_FILE)
+    return predictor
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    payload = request.get_json(silent=True)
+    if payload is None:
+        payload = {}
+    if not isinstance(payload, dict):
+        return json.dumps({"error": "expected a JSON object"}), 400
+    text = request.form.get('text') or payload.get('text', '')
+    if not isinstance(text, basestring):
+        return json.dumps({"error": "text must be a string"}), 400
+    if not text.strip():
+        return json.dumps({"error": "no text provided"}), 400
+    return json.dumps(get_predictor().predict(text))
+
+@app.route('/predict/stats')
+def predict_stats():
+    return json.dumps(get_predictor().stats())
+
 if __name__ == '__main__':
-    app.run()
+    app.run(threaded=True)
 
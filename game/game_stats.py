@@ -0,0 +1,39 @@
+import sqlite3
+import threading
+
+# Counts the games played and the computer's correct predictions across every worker
+#   process. The counts live in their own SQLite database in WAL mode, so that
+#   concurrent updates are serialized by SQLite and readers never block the writer.
+class GameStats(object):
+    def __init__(self, database_name, timeout=10):
+        self.database_name = database_name
+        self.timeout = timeout
+        self._local = threading.local()
+
+        # This connection is closed right away so that none is shared with forked workers.
+        con = sqlite3.connect(self.database_name, timeout=self.timeout)
+        con.execute("PRAGMA journal_mode=WAL")
+        with con:
+            con.execute(" ".join([
+                "CREATE TABLE IF NOT EXISTS game_stats",
+                "(id INTEGER PRIMARY KEY CHECK (id = 0), num_total INTEGER, num_correct INTEGER)"
+            ]))
+            con.execute("INSERT OR IGNORE INTO game_stats VALUES (0, 0, 0)")
+        con.close()
+
+    def _connect(self):
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = sqlite3.connect(self.database_name, timeout=self.timeout)
+            con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    # Records one game and returns the updated (num_total, num_correct).
+    def record(self, correct):
+        con = self._connect()
+        with con:
+            con.execute(" ".join([
+                "UPDATE game_stats SET num_total = num_total + 1,",
+                "num_correct = num_correct + ? WHERE id = 0"
+            ]), (int(correct),))
+            return con.execute("SELECT num_total, num_correct FROM game_stats").fetchone()
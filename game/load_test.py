@@ -0,0 +1,79 @@
+import os
+import sys
+import time
+import urllib2
+import argparse
+import subprocess
+from multiprocessing import Pool
+
+# Requests a list of paths in a loop until the deadline, returning the number of
+#   successful responses.
+def run_client(args):
+    base_url, paths, deadline = args
+    opener = urllib2.build_opener(urllib2.HTTPCookieProcessor())
+    num_done = 0
+    while time.time() < deadline:
+        for path in paths:
+            try:
+                opener.open(base_url + path).read()
+                num_done += 1
+            except IOError:
+                pass
+    return num_done
+
+def wait_for_server(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            urllib2.urlopen(base_url + "/details/").read()
+            return
+        except IOError:
+            time.sleep(.2)
+    raise RuntimeError("The server did not start within %d seconds." % timeout)
+
+# Starts gunicorn with the given number of workers and measures requests per second
+#   from a fixed number of concurrent clients.
+def measure(num_workers, num_clients, seconds, port, paths):
+    base_url = "http://127.0.0.1:%d" % port
+    env = dict(os.environ, GAME_SECRET_KEY=os.environ.get("GAME_SECRET_KEY", "load-test"))
+    server = subprocess.Popen(
+        ["gunicorn", "--workers", str(num_workers), "--bind", "127.0.0.1:%d" % port,
+         "game:app"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env)
+    try:
+        wait_for_server(base_url)
+        pool = Pool(num_clients)
+        deadline = time.time() + seconds
+        start = time.time()
+        num_done = sum(pool.map(run_client, [(base_url, paths, deadline)]*num_clients))
+        elapsed = time.time() - start
+        pool.close()
+        pool.join()
+    finally:
+        server.terminate()
+        server.wait()
+    return num_done/elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Measure game server throughput as the number of gunicorn workers grows.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="worker counts to try (default: 1 2 4)")
+    parser.add_argument("--clients", type=int, default=16,
+                        help="number of concurrent client processes (default: 16)")
+    parser.add_argument("--seconds", type=float, default=10,
+                        help="length of each measurement (default: 10)")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="port for the server (default: 8765)")
+    parser.add_argument("--paths", nargs="+",
+                        default=["/", "/values/?table=coefs&type=all&order=descMag&from=1&to=50"],
+                        help="paths requested by each client in turn")
+    args = parser.parse_args()
+
+    baseline = None
+    for num_workers in args.workers:
+        throughput = measure(num_workers, args.clients, args.seconds, args.port, args.paths)
+        baseline = baseline or throughput
+        print "%d worker(s): %.1f requests/sec (%.2fx)" % (
+            num_workers, throughput, throughput/baseline)
+        sys.stdout.flush()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+try:
+    from Queue import Queue, Empty
+except ImportError:
+    from queue import Queue, Empty
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers.compact_model import CompactScorer, speaker_label
+from helpers.preprocessing import process_speech, process_pos
+from helpers.tagger import tag_texts
+
+FEATURE_TYPES = {"speech": "word", "pos": "pos"}
+
+class PendingPrediction(object):
+    def __init__(self, document):
+        self.document = document
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Classifies raw transcripts with the compact model. Requests arriving from different
+#   threads within max_wait seconds of each other are scored together in a single
+#   sparse matrix product by a background thread.
+class BatchPredictor(object):
+    def __init__(self, model_file, max_batch_size=32, max_wait=.005, num_features=10,
+                 latency_window=10000):
+        self.scorer = CompactScorer(model_file)
+        self.feature_names = self.scorer.feature_names()
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.num_features = num_features
+
+        self.queue = Queue()
+        self.latencies = deque(maxlen=latency_window)
+        self.batch_sizes = deque(maxlen=latency_window)
+        self._lock = threading.Lock()
+        thread = threading.Thread(target=self._run)
+        thread.daemon = True
+        thread.start()
+
+    # Preprocesses a transcript the same way as the training data.
+    def prepare(self, text):
+        pos = " ".join([pair[1] for pair in tag_texts([text], processes=1)[0] or []])
+        return {"processed_speech": process_speech(text),
+                "processed_pos": process_pos(pos)}
+
+    def predict(self, text):
+        start = time.time()
+        pending = PendingPrediction(self.prepare(text))
+        self.queue.put(pending)
+        pending.done.wait()
+        with self._lock:
+            self.latencies.append(time.time() - start)
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def _describe(self, row, decision):
+        order = np.argsort(-np.abs(row.data))[:self.num_features]
+        features = []
+        for i in order:
+            block_name, term = self.feature_names[row.indices[i]]
+            features.append({"feature": term,
+                             "type": FEATURE_TYPES.get(block_name, block_name),
+                             "contribution": round(float(row.data[i]), 7)})
+        return {"predicted": speaker_label(decision),
+                "margin": float(decision),
+                "top_features": features}
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                contributions = self.scorer.contributions([pending.document for pending in batch])
+                decisions = np.asarray(contributions.sum(axis=1)).ravel() + self.scorer.intercept
+                for i, pending in enumerate(batch):
+                    pending.result = self._describe(contributions.getrow(i), decisions[i])
+            except Exception as err:
+                for pending in batch:
+                    pending.error = err
+            finally:
+                with self._lock:
+                    self.batch_sizes.append(len(batch))
+                for pending in batch:
+                    pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self.latencies)
+            batch_sizes = list(self.batch_sizes)
+        if not latencies:
+            return {"requests": 0}
+        return {"requests": len(latencies),
+                "p50_ms": round(1000*np.percentile(latencies, 50), 3),
+                "p99_ms": round(1000*np.percentile(latencies, 99), 3),
+                "mean_batch_size": round(np.mean(batch_sizes), 3) if batch_sizes else 0}
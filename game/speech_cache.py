@@ -0,0 +1,197 @@
+import os
+import sys
+import sqlite3
+import threading
+from collections import OrderedDict
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from helpers import contrib_arrays
+
+# The sort keys for each order accepted by /values (descending or ascending magnitude or value).
+ORDERS = {
+    "descMag": (lambda row: row[3], True),
+    "ascMag": (lambda row: row[3], False),
+    "descVal": (lambda row: row[1], True),
+    "ascVal": (lambda row: row[1], False)
+}
+
+TYPES = {
+    "all": ("word", "pos", "intercept"),
+    "word": ("word",),
+    "pos": ("pos",)
+}
+
+# Sorts (long_name, value, feature_type, abs_value, search_name) rows once per order.
+def sort_rows(rows):
+    return dict([(order, sorted(rows, key=key, reverse=reverse))
+                 for order, (key, reverse) in ORDERS.items()])
+
+# Opens a database read-only. Locking stays on, so while populate_game_database.py
+#   rewrites the database in WAL mode, readers keep seeing the last committed state.
+#   Python 2's sqlite3 has no uri argument, so there the connection is an ordinary one
+#   on which query_only makes SQLite refuse every write. Transactions are managed by
+#   hand (see SpeechCache._load).
+def connect_read_only(database_name):
+    uri = "file:%s?mode=ro" % os.path.abspath(database_name)
+    try:
+        con = sqlite3.connect(uri, uri=True)
+    except TypeError:
+        con = sqlite3.connect(database_name)
+        con.execute("PRAGMA query_only=ON")
+    con.isolation_level = None
+    return con
+
+# Identifies the committed state of a database. In WAL mode a commit only touches the
+#   -wal file until it is checkpointed into the database file, so both are checked.
+def get_version(database_name):
+    wal_name = database_name + "-wal"
+    return (os.path.getmtime(database_name),
+            os.path.getmtime(wal_name) if os.path.exists(wal_name) else None)
+
+# Keeps the game's read-only tables in memory. The coefficients and speech ids are
+#   loaded on first use, and the labels, html bodies and sorted contributions of the
+#   most recently used speeches are kept in a bounded LRU. Everything is reloaded
+#   when the database changes.
+# Each thread reads through its own read-only connection, so the cache can be shared
+#   by the threads of a worker process and created before a server forks its workers.
+class SpeechCache(object):
+    def __init__(self, database_name, max_speeches=256, contrib_dir=None):
+        self.database_name = database_name
+        self.max_speeches = max_speeches
+        self.contrib_dir = contrib_dir
+        self.contrib_arrays = None
+        self.version = None
+        self.speech_ids = []
+        self.coefs = {}
+        self.speeches = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if getattr(self._local, "con", None) is None:
+            self._local.con = connect_read_only(self.database_name)
+        return self._local.con
+
+    # Reads everything in one read transaction, so the tables all come from the same
+    #   run of populate_game_database.py even if another run commits meanwhile.
+    # The version is read first, so a commit made during the load triggers another one,
+    #   and recorded only once the load succeeds, so a failed load is retried.
+    def _load(self):
+        version = get_version(self.database_name)
+        con = self._connect()
+        con.execute("BEGIN")
+        try:
+            self._load_tables(con)
+        finally:
+            con.execute("COMMIT")
+        self.version = version
+
+    def _load_tables(self, con):
+        self.speech_ids = [row[0] for row in con.execute("SELECT id FROM speeches")]
+        coefs = con.execute(" ".join([
+            "SELECT long_name, value, feature_type, abs_value, search_name FROM coefs"
+        ])).fetchall()
+        self.coefs = sort_rows(coefs)
+        self.speeches = OrderedDict()
+
+        # Contributions are read from memory-mapped arrays when populate_game_database.py
+        #   has written them, and from the contribs table otherwise. The features and
+        #   the version of the arrays that index into them are read in one statement, so
+        #   they always come from the same run.
+        self.contrib_arrays = None
+        if self.contrib_dir and con.execute(" ".join([
+                "SELECT COUNT(*) FROM sqlite_master",
+                "WHERE type='table' AND name='contrib_arrays'"])).fetchone()[0]:
+            rows = con.execute(" ".join([
+                "SELECT long_name, feature_type, search_name, version",
+                "FROM features, contrib_arrays ORDER BY feature_index"
+            ])).fetchall()
+            if rows:
+                self.features = [row[:3] for row in rows]
+                self.contrib_arrays = contrib_arrays.ContribArrays(self.contrib_dir, rows[0][3])
+
+    # Drops everything if populate_game_database.py has rewritten the database.
+    def _check(self):
+        if get_version(self.database_name) != self.version:
+            self._load()
+
+    def _load_speech(self, speech_id):
+        row = self._connect().execute(" ".join([
+            "SELECT predicted, observed, n_contributors, body FROM speeches WHERE id=?"
+        ]), (speech_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": speech_id,
+            "predicted": row[0],
+            "observed": row[1],
+            "num_contributors": row[2],
+            "body": row[3]
+        }
+
+    def _load_contribs(self, speech_id):
+        if self.contrib_arrays is not None:
+            features, values = self.contrib_arrays.get(speech_id)
+            return sort_rows([(self.features[feature][0], value, self.features[feature][1],
+                               abs(value), self.features[feature][2])
+                              for feature, value in zip(features.tolist(), values.tolist())])
+
+        contribs = self._connect().execute(" ".join([
+            "SELECT long_name, value, feature_type, abs_value, search_name FROM contribs",
+            "WHERE speech_id=?"
+        ]), (speech_id,)).fetchall()
+        return sort_rows(contribs)
+
+    # Returns the folder holding the snapshots written along with the contribution
+    #   arrays in use, or None if there are no arrays.
+    def get_snapshot_dir(self):
+        with self._lock:
+            self._check()
+            if self.contrib_arrays is None:
+                return None
+            return os.path.join(self.contrib_arrays.path, "snapshots")
+
+    def get_speech_ids(self):
+        with self._lock:
+            self._check()
+            return self.speech_ids
+
+    # Returns the labels, contributor count and html body of a speech, or None if there
+    #   is no such speech. Its sorted contributions are added by get_values when first needed.
+    def get_speech(self, speech_id):
+        speech_id = int(speech_id)
+        with self._lock:
+            self._check()
+            speech = self.speeches.pop(speech_id, None)
+            if speech is None:
+                speech = self._load_speech(speech_id)
+                if speech is None:
+                    return None
+            self.speeches[speech_id] = speech
+            while len(self.speeches) > self.max_speeches:
+                self.speeches.popitem(last=False)
+            return speech
+
+    # Returns the (long_name, value) pairs ranked lower through upper (starting at 1)
+    #   for the coefficients, or for one speech's contributions if speech_id is given.
+    def get_values(self, speech_id, feature_type, search, order, lower, upper):
+        if speech_id is None:
+            with self._lock:
+                self._check()
+                rows = self.coefs[order]
+        else:
+            speech = self.get_speech(speech_id) or {"contribs": sort_rows([])}
+            with self._lock:
+                if "contribs" not in speech:
+                    speech["contribs"] = self._load_contribs(speech["id"])
+            rows = speech["contribs"][order]
+
+        types = TYPES[feature_type]
+        search = search.lower()
+        pairs = []
+        for long_name, value, row_type, _, search_name in rows:
+            if row_type in types and search in search_name:
+                if len(pairs) == upper:
+                    break
+                pairs.append((long_name, value))
+        return pairs[max(lower - 1, 0):]
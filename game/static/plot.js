@@ -71,7 +71,62 @@ function makePlots(table_name, xLabel, maxUpper, speechID) {
     getValues(lowerVal, upperVal, text.value, type.value, order.value);
   }
 
+  // Fetches every value of this plot once. If the snapshot is unavailable,
+  // each redraw asks /values for the current page instead.
+  var snapshot = null;
+
+  function loadSnapshot() {
+    var http = new XMLHttpRequest(),
+        name = (table_name == "contribs" ? "contribs_" + speechID : "coefs");
+
+    http.open("GET", "/snapshots/" + name + ".json.gz");
+    http.addEventListener("load", function(res) {
+      if (res.target.status == 200) {
+        try {
+          snapshot = JSON.parse(res.target.response);
+          snapshot.searchNames = snapshot.names.map(function(name) {
+            return name.split(":").pop().toLowerCase();
+          });
+        } catch (err) {
+          // A snapshot that can't be read is ignored in favor of /values.
+          snapshot = null;
+        }
+      }
+      inputHandler();
+    });
+    http.addEventListener("error", inputHandler);
+    http.send();
+  }
+
+  function getSnapshotValues(lowerVal, upperVal, textVal, typeVal, orderVal) {
+    var ranking = snapshot.orders[orderVal][typeVal],
+        search = textVal.toLowerCase(),
+        featureNames = [],
+        values = [];
+
+    for (var i = 0; i < ranking.length && values.length < upperVal; i++) {
+      var j = ranking[i];
+      if (snapshot.searchNames[j].indexOf(search) != -1) {
+        featureNames.push(snapshot.names[j]);
+        values.push(snapshot.values[j]);
+      }
+    }
+    featureNames = featureNames.slice(lowerVal - 1);
+    values = values.slice(lowerVal - 1);
+
+    return {
+      feature_names: featureNames,
+      values: values,
+      mag: (values.length ? d3.max(values, Math.abs) : 1)
+    };
+  }
+
   function getValues(lowerVal, upperVal, textVal, typeVal, orderVal) {
+    if (snapshot) {
+      updateData(getSnapshotValues(lowerVal, upperVal, textVal, typeVal, orderVal));
+      return;
+    }
+
     var http = new XMLHttpRequest(),
         url = "/values?" + [
           ["table", table_name].join("="),
@@ -89,8 +144,11 @@ function makePlots(table_name, xLabel, maxUpper, speechID) {
   }
 
   function updateGraph(res) {
-    var data = JSON.parse(res.target.response),
-        featureNames = data.feature_names,
+    updateData(JSON.parse(res.target.response));
+  }
+
+  function updateData(data) {
+    var featureNames = data.feature_names,
         values = data.values,
         mag = data.mag;
 
@@ -157,6 +215,6 @@ function makePlots(table_name, xLabel, maxUpper, speechID) {
       .call(yAxis); 
   }
 
-  inputHandler();
+  loadSnapshot();
 
 }
@@ -0,0 +1,110 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import make_data
+from helpers.http_cache import ResponseCache
+
+# The original normalization code, kept as a reference for checking the new version.
+def legacy_translate_from_unicode(text):
+    unicode_vocab = {"-": [u"\u2013"],
+                     "--": [u"\u2014", u"\u2015"],
+                     "'": [u"\u2018", u"\u2019", u"\u201b", u"\u201c",
+                           u"\u201d", u"\u2032"],
+                     ",": [u"\u201a"],
+                     "/": [u"\u2044"],
+                     "...": [u"\u2026"],
+                     " ": [u"\xa0", u"\t", u"\r"],
+                     "n": [u"\xf1"]}
+    for char, codes in unicode_vocab.items():
+        for code in codes:
+            text = text.replace(code, char)
+    return str(text)
+
+# Every code point the legacy normalizer maps.
+MAPPED_CODES = [u"\u2013", u"\u2014", u"\u2015", u"\u2018", u"\u2019", u"\u201b", u"\u201c",
+                u"\u201d", u"\u2032", u"\u201a", u"\u2044", u"\u2026", u"\xa0", u"\t", u"\r",
+                u"\xf1"]
+
+# Builds texts covering every mapped code point alone and in ASCII context, mixed and
+#   ASCII-only strings, and strings with unmapped characters that must raise UnicodeError.
+def build_check_texts():
+    texts = [u"", u"Good morning.", u"plain ascii -- with 'quotes', tabs and ... dots"]
+    for code in MAPPED_CODES:
+        texts += [code, code*3, u"a%sb" % code, u"This week%s I met with Congress." % code]
+    texts.append(u"".join(MAPPED_CODES))
+    texts.append(u"Espa\xf1ol\xa0\u2014 the \u201cbudget\u201d\u2026\r\n\tand/or 1\u20442")
+    texts += [u"caf\xe9", u"\u2014caf\xe9\u2014", u"\u2603", u"price: \u20ac5\u2026"]
+    return texts
+
+def normalize_all(texts, translate):
+    results = []
+    for text in texts:
+        try:
+            results.append(translate(text))
+        except UnicodeError as err:
+            results.append(type(err))
+    return results
+
+# Parses every cached transcript page into the raw text handed to the normalizer.
+def load_raw_texts(cache_dir):
+    cache = ResponseCache(cache_dir, max_bytes=None, offline=True)
+    texts = []
+    for url, page in cache.iter_pages():
+        try:
+            if url.startswith(make_data.OBAMA_BASE_URL) and "weekly-address?page=" not in url:
+                texts.append(make_data.parse_obama_transcript(page, url).split("# ")[0])
+            elif url.startswith(make_data.BUSH_BASE_URL) and not url.endswith("/news/radio/"):
+                texts += make_data.parse_bush_transcript(page, url) or []
+        except IndexError:
+            continue
+    cache.close()
+    return texts
+
+def time_it(function, *args):
+    start = time.time()
+    result = function(*args)
+    return result, time.time() - start
+
+# Compares both normalizers on build_check_texts, without any cached pages.
+def check():
+    texts = build_check_texts()
+    legacy = normalize_all(texts, legacy_translate_from_unicode)
+    current = normalize_all(texts, make_data.translate_from_unicode)
+    mismatches = [(text, a, b) for text, a, b in zip(texts, legacy, current) if a != b]
+    for text, a, b in mismatches:
+        print "%r: legacy %r, current %r" % (text, a, b)
+    if mismatches:
+        sys.exit("\nRegression: %d of %d outputs differ." % (len(mismatches), len(texts)))
+    print "All %d check outputs are identical." % len(texts)
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ["--check"]:
+        check()
+        sys.exit()
+    try:
+        cache_dir = sys.argv[1]
+    except IndexError:
+        print "usage: benchmark_normalizer.py (cache_dir | --check)"
+        sys.exit("\nExecution failed: user must provide the location of cached pages.")
+
+    print "Loading cached transcripts..."
+    texts = load_raw_texts(cache_dir)
+    num_chars = sum([len(text) for text in texts])
+    print "Loaded %d texts (%d characters)." % (len(texts), num_chars)
+
+    legacy, legacy_seconds = time_it(normalize_all, texts, legacy_translate_from_unicode)
+    current, current_seconds = time_it(normalize_all, texts, make_data.translate_from_unicode)
+    mismatches = [i for i, (a, b) in enumerate(zip(legacy, current)) if a != b]
+
+    print "Legacy normalizer: %.3f sec (%.1f MB/sec)" % (
+        legacy_seconds, num_chars/legacy_seconds/2**20)
+    print "Current normalizer: %.3f sec (%.1f MB/sec)" % (
+        current_seconds, num_chars/current_seconds/2**20)
+    print "Speedup: %.1fx" % (legacy_seconds/current_seconds)
+
+    if mismatches:
+        sys.exit("\nRegression: %d of %d outputs differ, starting at text %d." % (
+            len(mismatches), len(texts), mismatches[0]))
+    print "All outputs are identical."
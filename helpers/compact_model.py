@@ -0,0 +1,182 @@
+import re
+import json
+import numpy as np
+import scipy.sparse as sp
+
+FORMAT_VERSION = 1
+
+# Names the predicted speaker the way the speaker column of radio_addresses does.
+#   Positive decisions are Obama, since the models are trained with Obama as class 1.
+def speaker_label(decision):
+    return "obama" if decision > 0 else "bush"
+
+# Describes how a fitted TfidfVectorizer turns text into tokens, so that a scorer can
+#   reproduce it without scikit-learn.
+def describe_vectorizer(vectorizer):
+    if vectorizer.analyzer != "word" or vectorizer.preprocessor is not None:
+        raise ValueError("Only word analyzers without custom preprocessors can be exported.")
+    if vectorizer.tokenizer is None:
+        tokenizer = None
+    elif getattr(vectorizer.tokenizer, "__name__", None) == "pos_tokenizer":
+        tokenizer = "whitespace"
+    else:
+        raise ValueError("Only the default tokenizer and pos_tokenizer can be exported.")
+    stop_words = vectorizer.get_stop_words()
+    return {
+        "tokenizer": tokenizer,
+        "token_pattern": vectorizer.token_pattern,
+        "lowercase": vectorizer.lowercase,
+        "stop_words": sorted(stop_words) if stop_words else None,
+        "ngram_range": list(vectorizer.ngram_range),
+        "encoding": vectorizer.encoding,
+        "decode_error": vectorizer.decode_error,
+        "binary": vectorizer.binary,
+        "use_idf": vectorizer.use_idf,
+        "sublinear_tf": vectorizer.sublinear_tf,
+        "norm": vectorizer.norm
+    }
+
+# Collapses a fitted pipeline from create_model into a single .npz file holding, for
+#   each feature block, its vocabulary, idf weights, and the coefficients of the
+#   selected features, along with the intercept.
+def export_compact_model(clf, path):
+    union = clf.named_steps["union"]
+    support = clf.named_steps["select"].get_support()
+    model = clf.named_steps["model"]
+    coefs = np.zeros(len(support))
+    coefs[support] = model.coef_[0]
+
+    arrays = {}
+    blocks = []
+    offset = 0
+    for name, pipeline in union.transformer_list:
+        vectorizer = pipeline.named_steps["create"]
+        if not hasattr(vectorizer, "vocabulary_"):
+            raise ValueError("Models trained with hashing have no vocabulary to export.")
+        vocabulary = vectorizer.vocabulary_
+        terms = np.empty(len(vocabulary), dtype=object)
+        terms[list(vocabulary.values())] = list(vocabulary.keys())
+        block_coefs = coefs[offset:offset + len(vocabulary)]
+        offset += len(vocabulary)
+
+        selected = np.flatnonzero(block_coefs)
+        arrays[name + "_terms"] = np.array(list(terms), dtype=np.unicode_)
+        arrays[name + "_selected"] = selected.astype(np.int32)
+        arrays[name + "_coefs"] = block_coefs[selected]
+        if vectorizer.use_idf:
+            arrays[name + "_idf"] = vectorizer.idf_
+
+        block = describe_vectorizer(vectorizer)
+        block.update({"name": name, "column": pipeline.named_steps["prepare"].column})
+        blocks.append(block)
+
+    meta = {"version": FORMAT_VERSION, "blocks": blocks,
+            "intercept": float(model.intercept_[0])}
+    arrays["meta"] = np.array(json.dumps(meta))
+    np.savez_compressed(path, **arrays)
+
+# Turns text into weighted term counts exactly like one fitted TfidfVectorizer.
+class CompactBlock(object):
+    def __init__(self, block, archive):
+        self.name = block["name"]
+        self.column = block["column"]
+        self.block = block
+        self.terms = archive[self.name + "_terms"]
+        self.vocabulary = dict(zip(self.terms.tolist(), range(len(self.terms))))
+        self.idf = archive[self.name + "_idf"] if block["use_idf"] else None
+        self.coefs = np.zeros(len(self.terms))
+        self.selected = archive[self.name + "_selected"]
+        self.coefs[self.selected] = archive[self.name + "_coefs"]
+        self.stop_words = frozenset(block["stop_words"] or [])
+        self.token_pattern = re.compile(block["token_pattern"], re.UNICODE)
+        self.min_n, self.max_n = block["ngram_range"]
+
+    def tokenize(self, document):
+        if isinstance(document, bytes):
+            document = document.decode(self.block["encoding"], self.block["decode_error"])
+        if self.block["lowercase"]:
+            document = document.lower()
+        if self.block["tokenizer"] == "whitespace":
+            tokens = document.split()
+        else:
+            tokens = self.token_pattern.findall(document)
+        if self.stop_words:
+            tokens = [token for token in tokens if token not in self.stop_words]
+
+        # Build n-grams the same way scikit-learn does.
+        if self.max_n == 1:
+            return tokens
+        ngrams = []
+        for n in range(self.min_n, min(self.max_n + 1, len(tokens) + 1)):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(u" ".join(tokens[i: i + n]))
+        return ngrams
+
+    # Returns a normalized (n_documents x n_terms) sparse matrix of feature values.
+    def transform(self, documents):
+        indptr = [0]
+        indices = []
+        data = []
+        for document in documents:
+            counts = {}
+            for token in self.tokenize(document):
+                index = self.vocabulary.get(token)
+                if index is not None:
+                    counts[index] = counts.get(index, 0) + 1
+            indices.extend(counts.keys())
+            data.extend(counts.values())
+            indptr.append(len(indices))
+        matrix = sp.csr_matrix((np.array(data, dtype=np.float64), indices, indptr),
+                               shape=(len(documents), len(self.terms)))
+        matrix.sort_indices()
+
+        if self.block["binary"]:
+            matrix.data.fill(1)
+        if self.block["sublinear_tf"]:
+            np.log(matrix.data, matrix.data)
+            matrix.data += 1
+        if self.idf is not None:
+            matrix = matrix * sp.diags(self.idf, 0)
+        if self.block["norm"] == "l2":
+            norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        elif self.block["norm"] == "l1":
+            norms = np.asarray(abs(matrix).sum(axis=1)).ravel()
+        else:
+            return matrix.tocsr()
+        norms[norms == 0] = 1.0
+        return (sp.diags(1.0/norms, 0) * matrix).tocsr()
+
+# Scores documents with an artifact written by export_compact_model.
+# Documents are dictionaries (or DataFrame rows) holding the preprocessed columns
+#   the model was trained on, e.g. processed_speech and processed_pos.
+class CompactScorer(object):
+    def __init__(self, path):
+        archive = np.load(path)
+        meta = json.loads(archive["meta"].item())
+        if meta["version"] != FORMAT_VERSION:
+            raise ValueError("Unsupported compact model version: %s" % meta["version"])
+        self.blocks = [CompactBlock(block, archive) for block in meta["blocks"]]
+        self.intercept = meta["intercept"]
+        self.coefs = np.concatenate([block.coefs for block in self.blocks])
+
+    def transform(self, documents):
+        if hasattr(documents, "to_dict"):
+            documents = documents.to_dict("records")
+        documents = list(documents)
+        return sp.hstack([block.transform([document[block.column] for document in documents])
+                          for block in self.blocks]).tocsr()
+
+    def decision_function(self, documents):
+        return self.transform(documents).dot(self.coefs) + self.intercept
+
+    # Predicts 1 (Obama) for positive decision values and 0 (Bush) otherwise.
+    def predict(self, documents):
+        return (self.decision_function(documents) > 0).astype(int)
+
+    # Returns a sparse matrix of each feature's contribution to each decision value.
+    def contributions(self, documents):
+        return (self.transform(documents) * sp.diags(self.coefs, 0)).tocsr()
+
+    # Returns (block name, term) for each column of the transformed matrix.
+    def feature_names(self):
+        return [(block.name, term) for block in self.blocks for term in block.terms.tolist()]
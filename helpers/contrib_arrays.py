@@ -0,0 +1,61 @@
+import os
+import time
+import shutil
+import binascii
+import numpy as np
+
+# Contributions are stored CSR-style: the contributions of the speech at position i
+#   of speech_ids are features[indptr[i]:indptr[i + 1]] (indices into the features
+#   table) and values[indptr[i]:indptr[i + 1]].
+ARRAYS = {
+    "speech_ids": np.int64,
+    "indptr": np.int64,
+    "features": np.int32,
+    "values": np.float32
+}
+
+# Writes a complete set of arrays into a new version folder inside directory and returns
+#   the version's name. The folder is filled under a temporary name and renamed into
+#   place, so a version is never seen half written. Readers find the current version
+#   in the database (see populate_contrib_data), which is updated in the same
+#   transaction as the features table the arrays index into.
+# If write_extra is given, it is called with the temporary folder before the rename, so
+#   other files (e.g. the plots' snapshots) are published along with the arrays.
+def write_contrib_arrays(directory, speech_ids, indptr, features, values, write_extra=None):
+    version = "%d-%s" % (time.time(), binascii.hexlify(os.urandom(4)))
+    temp_path = os.path.join(directory, version + ".tmp")
+    os.makedirs(temp_path)
+    arrays = {"speech_ids": speech_ids, "indptr": indptr,
+              "features": features, "values": values}
+    for name, dtype in ARRAYS.items():
+        np.save(os.path.join(temp_path, name + ".npy"), np.asarray(arrays[name], dtype=dtype))
+    if write_extra is not None:
+        write_extra(temp_path)
+    os.rename(temp_path, os.path.join(directory, version))
+    return version
+
+# Deletes every version except the ones given. The previous version should be kept
+#   too, since a server may have read its name just before the database was updated.
+def remove_old_versions(directory, keep):
+    for name in os.listdir(directory):
+        if name not in keep:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+# Reads one version written by write_contrib_arrays as memory maps, so looking up a
+#   speech only touches the pages holding its contributions.
+class ContribArrays(object):
+    def __init__(self, directory, version):
+        path = os.path.join(directory, version)
+        self.path = path
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, name + ".npy"), mmap_mode="r"))
+        self.positions = dict([(speech_id, i)
+                               for i, speech_id in enumerate(self.speech_ids.tolist())])
+
+    # Returns views of the feature indices and values of a speech's contributions.
+    def get(self, speech_id):
+        i = self.positions.get(speech_id)
+        if i is None:
+            return self.features[:0], self.values[:0]
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return self.features[start:end], self.values[start:end]
@@ -0,0 +1,16 @@
+import sys
+
+from modeler import *
+from compact_model import export_compact_model
+
+# Writes the compact scoring artifact for an existing joblib model.
+if __name__ == '__main__':
+    try:
+        model_file = sys.argv[1]
+        output_file = sys.argv[2]
+    except IndexError:
+        print "usage: export_model.py model_file output_file"
+        sys.exit("\nExecution failed: incorrect usage.")
+
+    export_compact_model(load_clf(model_file), output_file)
+    print "Compact model saved as '%s'." % output_file
@@ -0,0 +1,87 @@
+import numbers
+import numpy as np
+import scipy.sparse as sp
+from sklearn.base import clone
+from sklearn.cross_validation import StratifiedKFold
+from sklearn.feature_extraction.text import CountVectorizer
+from sklearn.metrics import f1_score
+from sklearn.preprocessing import normalize
+
+# Parameters of a TfidfVectorizer that decide which tokens get counted.
+ANALYZER_PARAMS = ["input", "encoding", "decode_error", "strip_accents", "lowercase",
+                   "preprocessor", "tokenizer", "analyzer", "stop_words", "token_pattern",
+                   "ngram_range", "binary"]
+
+# Cross validates pipelines built by create_model without re-tokenizing the corpus.
+# Each distinct tokenization is counted once over all the training documents, and every
+#   fold derives its document frequency filtering, idf weights and normalization from
+#   the rows of that count matrix, reproducing what the TfidfVectorizers would compute.
+class FeatureCache(object):
+    def __init__(self, data, targets, n_folds=10):
+        self.data = data
+        self.targets = np.asarray(targets)
+        self.folds = list(StratifiedKFold(self.targets, n_folds=n_folds))
+        self._counts = {}
+
+    def counts(self, column, vectorizer):
+        params = vectorizer.get_params()
+        count_params = dict([(name, params[name]) for name in ANALYZER_PARAMS])
+        key = (column, tuple(sorted(count_params.items())))
+        if key not in self._counts:
+            count_vectorizer = CountVectorizer(**count_params)
+            self._counts[key] = count_vectorizer.fit_transform(self.data[column]).tocsr()
+        return self._counts[key]
+
+    # Computes tf or tf-idf features for one fold, mimicking TfidfVectorizer.fit_transform
+    #   on the training rows and TfidfVectorizer.transform on the testing rows.
+    def _fold_features(self, counts, vectorizer, train, test):
+        counts_train = counts[train]
+        n_docs = counts_train.shape[0]
+        dfs = np.bincount(counts_train.indices, minlength=counts_train.shape[1])
+
+        max_df, min_df = vectorizer.max_df, vectorizer.min_df
+        max_doc_count = max_df if isinstance(max_df, numbers.Integral) else max_df * n_docs
+        min_doc_count = min_df if isinstance(min_df, numbers.Integral) else min_df * n_docs
+        mask = (dfs > 0) & (dfs <= max_doc_count) & (dfs >= min_doc_count)
+        if not mask.any():
+            raise ValueError("After pruning, no terms remain. Try a lower"
+                             " min_df or a higher max_df.")
+        kept = np.flatnonzero(mask)
+
+        features_train = counts_train[:, kept].astype(np.float64)
+        features_test = counts[test][:, kept].astype(np.float64)
+        if vectorizer.use_idf:
+            idf = np.log(float(n_docs + 1) / (dfs[kept] + 1)) + 1.0
+            idf_diag = sp.diags(idf, 0)
+            features_train = features_train * idf_diag
+            features_test = features_test * idf_diag
+        return normalize(features_train), normalize(features_test)
+
+    # Returns one F1 score per fold, exactly like cross_val_score(scoring="f1", cv=10).
+    # A subset of fold indices can be passed to score only those folds.
+    def cross_val_score(self, clf, fold_indices=None):
+        if fold_indices is None:
+            fold_indices = range(len(self.folds))
+
+        union = clf.named_steps["union"]
+        scores = []
+        for i in fold_indices:
+            train, test = self.folds[i]
+            blocks_train, blocks_test = [], []
+            for _, pipeline in union.transformer_list:
+                column = pipeline.named_steps["prepare"].column
+                vectorizer = pipeline.named_steps["create"]
+                counts = self.counts(column, vectorizer)
+                block_train, block_test = self._fold_features(counts, vectorizer, train, test)
+                blocks_train.append(block_train)
+                blocks_test.append(block_test)
+            features_train = sp.hstack(blocks_train).tocsr()
+            features_test = sp.hstack(blocks_test).tocsr()
+
+            select = clone(clf.named_steps["select"])
+            model = clone(clf.named_steps["model"])
+            selected_train = select.fit_transform(features_train, self.targets[train])
+            model.fit(selected_train, self.targets[train])
+            predicted = model.predict(select.transform(features_test))
+            scores.append(f1_score(self.targets[test], predicted))
+        return np.array(scores)
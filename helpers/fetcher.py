@@ -0,0 +1,125 @@
+import time
+import threading
+from multiprocessing.pool import ThreadPool
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth retrying because they are usually transient.
+RETRY_STATUSES = set([429, 500, 502, 503, 504])
+
+class FetchError(Exception):
+    pass
+
+# Downloads pages over a pooled session using a bounded number of threads.
+# Each host gets its own concurrency limit so that the archive sites aren't hammered.
+# If a ResponseCache is provided, cached pages are revalidated instead of downloaded
+#   again, and nothing touches the network when the cache is offline.
+class Fetcher(object):
+    def __init__(self, max_workers=16, per_host=4, retries=3, backoff=0.5, timeout=30, 
+                 cache=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._host_locks = {}
+        self._lock = threading.Lock()
+        self.num_pages = 0
+        self.num_cached = 0
+        self.seconds = 0.0
+
+    def _host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_locks:
+                self._host_locks[host] = threading.BoundedSemaphore(self.per_host)
+            return self._host_locks[host]
+
+    # Issues a single GET, retrying connection errors and transient
+    #   server errors with exponential backoff.
+    def get(self, url, headers=None):
+        semaphore = self._host_semaphore(url)
+        for attempt in range(self.retries + 1):
+            try:
+                with semaphore:
+                    response = self.session.get(url, headers=headers, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as err:
+                if attempt == self.retries:
+                    raise FetchError("Failed to download %s: %s" % (url, err))
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+            time.sleep(self.backoff * 2**attempt)
+
+    def fetch(self, url):
+        if self.cache is None:
+            return self.get(url).text
+
+        entry = self.cache.lookup(url)
+        if self.cache.offline:
+            if entry is None:
+                raise FetchError("No cached copy of %s is available offline." % url)
+            self._count_cached()
+            return self.cache.text(entry)
+
+        headers = self.cache.validators(entry) if entry else None
+        try:
+            response = self.get(url, headers=headers)
+        except FetchError:
+            if entry is None:
+                raise
+            response = None
+        # Falls back on the cached copy when a page can't be revalidated.
+        if entry and (response is None or response.status_code != 200):
+            self._count_cached()
+            return self.cache.text(entry)
+        if response.status_code == 200:
+            encoding = response.encoding or response.apparent_encoding
+            response.encoding = encoding
+            self.cache.store(url, response.content, 
+                             etag=response.headers.get("ETag"),
+                             last_modified=response.headers.get("Last-Modified"),
+                             encoding=encoding)
+        return response.text
+
+    def _count_cached(self):
+        with self._lock:
+            self.num_cached += 1
+
+    # Downloads every url concurrently and returns page text in the same order.
+    def fetch_all(self, urls):
+        urls = list(urls)
+        if not urls:
+            return []
+        start = time.time()
+        pool = ThreadPool(min(self.max_workers, len(urls)))
+        try:
+            pages = pool.map(self.fetch, urls)
+        finally:
+            pool.close()
+            pool.join()
+        self.num_pages += len(urls)
+        self.seconds += time.time() - start
+        return pages
+
+    def pages_per_second(self):
+        if not self.seconds:
+            return 0.0
+        return self.num_pages/self.seconds
+
+    def close(self):
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,132 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# Stores raw page bodies on disk, named by the sha1 of their contents, with a small
+#   SQLite index mapping each url to its body and the validators needed for revalidation.
+class ResponseCache(object):
+    def __init__(self, directory, max_bytes=500*2**20, offline=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.objects_dir = os.path.join(directory, "objects")
+        if not os.path.isdir(self.objects_dir):
+            os.makedirs(self.objects_dir)
+
+        self._lock = threading.Lock()
+        self._con = sqlite3.connect(os.path.join(directory, "index.db"),
+                                    check_same_thread=False)
+        self._con.execute(" ".join([
+            "CREATE TABLE IF NOT EXISTS entries (",
+            "url TEXT PRIMARY KEY, digest TEXT, etag TEXT, last_modified TEXT,",
+            "encoding TEXT, size INTEGER, accessed REAL)"
+        ]))
+        self._con.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        self._con.commit()
+
+    def _path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    # Returns the cached entry for a url as a dictionary, or None.
+    def lookup(self, url):
+        with self._lock:
+            row = self._con.execute(
+                "SELECT digest, etag, last_modified, encoding FROM entries WHERE url=?",
+                (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._con.execute("UPDATE entries SET accessed=? WHERE url=?", (time.time(), url))
+            self._con.commit()
+        if not os.path.exists(self._path(row[0])):
+            return None
+        return {"digest": row[0], "etag": row[1],
+                "last_modified": row[2], "encoding": row[3]}
+
+    # Builds the headers for a conditional GET against a cached entry.
+    def validators(self, entry):
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, entry):
+        with open(self._path(entry["digest"]), "rb") as f:
+            return f.read()
+
+    def text(self, entry):
+        return self.read(entry).decode(entry["encoding"] or "utf-8", "replace")
+
+    def store(self, url, body, etag=None, last_modified=None, encoding=None):
+        digest = hashlib.sha1(body).hexdigest()
+        path = self._path(digest)
+        if not os.path.exists(path):
+            if not os.path.isdir(os.path.dirname(path)):
+                try:
+                    os.makedirs(os.path.dirname(path))
+                except OSError:
+                    pass # Another thread created it first.
+            temp_path = "%s.%d.tmp" % (path, threading.current_thread().ident)
+            with open(temp_path, "wb") as f:
+                f.write(body)
+            os.rename(temp_path, path)
+
+        with self._lock:
+            self._con.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, etag, last_modified, encoding, len(body), time.time())
+            )
+            self._con.commit()
+        self.evict()
+
+    def total_bytes(self):
+        with self._lock:
+            return self._con.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)"
+            ).fetchone()[0]
+
+    # Drops the least recently used urls until the stored bodies fit within max_bytes.
+    def evict(self):
+        if self.max_bytes is None or self.total_bytes() <= self.max_bytes:
+            return
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT url, digest FROM entries ORDER BY accessed"
+            ).fetchall()
+            sizes = dict(self._con.execute("SELECT digest, size FROM entries").fetchall())
+            refs = {}
+            for _, digest in rows:
+                refs[digest] = refs.get(digest, 0) + 1
+            total = sum(sizes.values())
+
+            for url, digest in rows:
+                if total <= self.max_bytes:
+                    break
+                self._con.execute("DELETE FROM entries WHERE url=?", (url,))
+                refs[digest] -= 1
+                if not refs[digest]:
+                    total -= sizes[digest]
+                    try:
+                        os.remove(self._path(digest))
+                    except OSError:
+                        pass
+            self._con.commit()
+
+    # Yields (url, text) for every cached page, which is handy for replaying parsers.
+    def iter_pages(self):
+        with self._lock:
+            rows = self._con.execute(
+                "SELECT url, digest, etag, last_modified, encoding FROM entries ORDER BY url"
+            ).fetchall()
+        for url, digest, etag, last_modified, encoding in rows:
+            entry = {"digest": digest, "etag": etag,
+                     "last_modified": last_modified, "encoding": encoding}
+            if os.path.exists(self._path(digest)):
+                yield url, self.text(entry)
+
+    def close(self):
+        self._con.close()
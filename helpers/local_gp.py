@@ -0,0 +1,67 @@
+import numpy as np
+from scipy.stats import norm
+
+# A small Gaussian process that proposes points to sample when no MOE server is available.
+# Batches of points are chosen with the "constant liar" heuristic: after each proposal,
+#   the point is added to the history as if it had achieved the best value seen so far,
+#   which pushes the next proposal elsewhere.
+class LocalGP(object):
+    def __init__(self, domain, length_scale=0.25, noise=1e-3, num_candidates=2000,
+                 random_state=None):
+        self.bounds = np.array(domain, dtype=float)
+        self.length_scale = length_scale
+        self.noise = noise
+        self.num_candidates = num_candidates
+        self.random = np.random.RandomState(random_state)
+
+    def _to_unit(self, points):
+        lower, upper = self.bounds[:, 0], self.bounds[:, 1]
+        return (np.asarray(points, dtype=float) - lower)/(upper - lower)
+
+    def _from_unit(self, points):
+        lower, upper = self.bounds[:, 0], self.bounds[:, 1]
+        return lower + points*(upper - lower)
+
+    def _kernel(self, a, b):
+        sq_dists = ((a[:, None, :] - b[None, :, :])**2).sum(axis=2)
+        return np.exp(-.5*sq_dists/self.length_scale**2)
+
+    # Computes the posterior mean and standard deviation at each candidate point.
+    def _posterior(self, points, values, candidates):
+        mean, scale = values.mean(), values.std() or 1.0
+        standardized = (values - mean)/scale
+        K = self._kernel(points, points) + self.noise*np.eye(len(points))
+        K_inv = np.linalg.inv(K)
+        K_star = self._kernel(candidates, points)
+        mu = K_star.dot(K_inv).dot(standardized)
+        var = 1.0 - (K_star.dot(K_inv)*K_star).sum(axis=1)
+        sigma = np.sqrt(np.maximum(var, 1e-12))
+        return mean + scale*mu, scale*sigma
+
+    # Finds the candidate with the largest expected improvement over the best (lowest) value.
+    def _best_candidate(self, points, values):
+        candidates = self.random.uniform(size=(self.num_candidates, self.bounds.shape[0]))
+        if len(points) < 2:
+            return candidates[0]
+        mu, sigma = self._posterior(points, values, candidates)
+        improvement = values.min() - mu
+        z = improvement/sigma
+        expected_improvement = improvement*norm.cdf(z) + sigma*norm.pdf(z)
+        return candidates[np.argmax(expected_improvement)]
+
+    # Proposes num_points points given previously sampled points and objective values.
+    def next_points(self, points, values, num_points=1):
+        num_dims = self.bounds.shape[0]
+        if len(points):
+            points = self._to_unit(points)
+        else:
+            points = np.empty((0, num_dims))
+        values = np.asarray(values, dtype=float)
+        proposals = []
+        for _ in range(num_points):
+            candidate = self._best_candidate(points, values)
+            proposals.append(list(self._from_unit(candidate)))
+            lie = values.min() if len(values) else 0.0
+            points = np.vstack([points, candidate])
+            values = np.append(values, lie)
+        return proposals
@@ -1,3 +1,5 @@
+import numbers
+import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.externals import joblib
 
@@ -14,6 +16,22 @@ class ItemSelector(BaseEstimator, TransformerMixin):
 def pos_tokenizer(string_of_tags):
     return string_of_tags.split()
 
+class DfFilter(BaseEstimator, TransformerMixin):
+    def __init__(self, min_df=1, max_df=1.0):
+        self.min_df = min_df
+        self.max_df = max_df
+
+    def fit(self, x, y=None):
+        num_docs = x.shape[0]
+        df = np.bincount(x.tocsr().indices, minlength=x.shape[1])
+        min_count = self.min_df if isinstance(self.min_df, numbers.Integral) else self.min_df*num_docs
+        max_count = self.max_df if isinstance(self.max_df, numbers.Integral) else self.max_df*num_docs
+        self.columns_ = np.flatnonzero((df >= max(min_count, 1)) & (df <= max_count))
+        return self
+
+    def transform(self, x):
+        return x.tocsc()[:, self.columns_].tocsr()
+
 def load_clf(model_file):
     return joblib.load(model_file)
 
@@ -1,12 +1,18 @@
+import os
 import re
 import sys
+import gzip
+import json
 import sqlite3
+import numpy as np
 import pandas as pd
 from nltk.tokenize.punkt import PunktSentenceTokenizer
-from nltk import pos_tag, word_tokenize
 from scipy.sparse import hstack, csr_matrix, diags
 
 from modeler import *  
+from tagger import TagCache, tag_texts
+from storage import connect, close, write_frame, write_table, write_tables
+from contrib_arrays import write_contrib_arrays, remove_old_versions
 
 # Joins processed testing data with the original raw data.
 def get_data(con_in):
@@ -21,73 +27,92 @@ def get_data(con_in):
     ])
     return pd.read_sql(command, con_in)
 
+POS_LABELS = {
+    "CC": "conjunction",
+    "CD": "number",
+    "DT": "determiner",
+    "EX": "existential",
+    "FW": "foreign",
+    "IN": "preposition",
+    "JJ": "adjective",
+    "JJR": "comparative adjective",
+    "JJS": "superlative adjective",
+    "MD": "modal",
+    "NN": "singular noun",
+    "NNS": "plural noun",
+    "NNP": "singular proper noun",
+    "NNPS": "plural proper noun",
+    "PDT": "predeterminer",
+    "POS": "possessive ending",
+    "PRP": "personal pronoun",
+    "PRP$": "possessive pronoun",
+    "RB": "adverb",
+    "RBR": "compariative adverb",
+    "RBS": "superlative adverb",
+    "RP": "particle",
+    "TO": "to",
+    "UH": "interjection",
+    "VB": "base verb",
+    "VBD": "past verb",
+    "VBG": "present particple verb",
+    "VBN": "past participle verb",
+    "VBP": "non-3rd person sing present verb",
+    "VBZ": "3rd person singular present verb",
+    "WDT": "wh-determiner",
+    "WP": "wh-pronoun",
+    "WP$": "possessive wh-pronoun",
+    "WRB": "Wh-adverb",
+}
+
+# Matches the first tag of a formatted pair, "(TAG,", and its last tag, " TAG)".
+POS_TAGS = "|".join([re.escape(tag) for tag in sorted(POS_LABELS, key=len, reverse=True)])
+POS_PAIR_ENDS = re.compile("(?<=\()(?:" + POS_TAGS + ")(?=,)|(?<= )(?:" + POS_TAGS + ")(?=\))")
+
 # Translates part of speech tags to nicely formatted text. 
 def create_pretty_pos_pairs(pos_pair):
-    pos_dict = {
-        "CC": "conjunction",
-        "CD": "number",
-        "DT": "determiner",
-        "EX": "existential",
-        "FW": "foreign",
-        "IN": "preposition",
-        "JJ": "adjective",
-        "JJR": "comparative adjective",
-        "JJS": "superlative adjective",
-        "MD": "modal",
-        "NN": "singular noun",
-        "NNS": "plural noun",
-        "NNP": "singular proper noun",
-        "NNPS": "plural proper noun",
-        "PDT": "predeterminer",
-        "POS": "possessive ending",
-        "PRP": "personal pronoun",
-        "PRP\$": "possessive pronoun",
-        "RB": "adverb",
-        "RBR": "compariative adverb",
-        "RBS": "superlative adverb",
-        "RP": "particle",
-        "TO": "to",
-        "UH": "interjection",
-        "VB": "base verb",
-        "VBD": "past verb",
-        "VBG": "present particple verb",
-        "VBN": "past participle verb",
-        "VBP": "non-3rd person sing present verb",
-        "VBZ": "3rd person singular present verb",
-        "WDT": "wh-determiner",
-        "WP": "wh-pronoun",
-        "WP\$": "possessive wh-pronoun",
-        "WRB": "Wh-adverb",
-    }  
     new_pos_pair = "(" + pos_pair.replace(" ", ", ") + ")"
-    for pos_key, pos_val in pos_dict.items():
-        exp = "|".join(["(?<= )" + pos_key + "(?=\))",
-                        "(?<=\()" + pos_key + "(?=,)"])
-        new_pos_pair = re.sub(exp, pos_val, new_pos_pair)
+    new_pos_pair = POS_PAIR_ENDS.sub(lambda m: POS_LABELS[m.group(0)], new_pos_pair)
     return "POS Pair: " + new_pos_pair
 
 def create_pretty_word(word):
     return 'Word: "' + word + '"'
 
+# Returns an array holding the term of each column of a fitted vectorizer.
+def invert_vocabulary(vectorizer):
+    terms = np.empty(len(vectorizer.vocabulary_), dtype=object)
+    terms[list(vectorizer.vocabulary_.values())] = list(vectorizer.vocabulary_.keys())
+    return terms
+
 # Extracts a list of feature indices and a list of feature names from imported model. 
 def get_features(clf): 
     speech_create = clf.named_steps["union"].get_params()["speech"].named_steps["create"]
     pos_create = clf.named_steps["union"].get_params()["pos"].named_steps["create"]
-
-    speech_vocab = dict([
-        (item[1], [item[0], create_pretty_word(item[0])]) 
-        for item in speech_create.vocabulary_.items()
-    ])
-    pos_vocab = dict([
-        (item[1] + len(speech_vocab), [item[0], create_pretty_pos_pairs(item[0])])
-        for item in pos_create.vocabulary_.items()
-    ])
-    extended_vocab = dict(speech_vocab.items() + pos_vocab.items())
-
-    support = clf.named_steps["select"].get_support()
-    support_indices = [i for i, logical in enumerate(support) if logical == True]
-    feature_names = [extended_vocab[key] for key in support_indices]
+    if not hasattr(speech_create, "vocabulary_"):
+        raise ValueError("Models trained with hashing have no vocabulary to name features with.")
+    speech_terms = invert_vocabulary(speech_create)
+    terms = np.concatenate([speech_terms, invert_vocabulary(pos_create)])
+
+    # Only the selected features are formatted.
+    support_indices = np.flatnonzero(clf.named_steps["select"].get_support())
+    feature_names = [[term, create_pretty_word(term) if i < len(speech_terms) 
+                            else create_pretty_pos_pairs(term)]
+                     for i, term in zip(support_indices, terms[support_indices])]
     
+    return support_indices.tolist(), feature_names
+
+# Reads the selected feature table from a file next to the model (e.g. 
+#   final_model.features.json), computing and saving it first if the model is newer.
+def load_features(clf, model_file):
+    features_file = os.path.splitext(model_file)[0] + ".features.json"
+    if (os.path.exists(features_file) and 
+        os.path.getmtime(features_file) >= os.path.getmtime(model_file)):
+        with open(features_file) as f:
+            features = json.load(f)
+        return features["support_indices"], features["feature_names"]
+
+    support_indices, feature_names = get_features(clf)
+    with open(features_file, "w") as f:
+        json.dump({"support_indices": support_indices, "feature_names": feature_names}, f)
     return support_indices, feature_names
 
 def determine_feature_type(long_name):
@@ -97,9 +122,14 @@ def determine_feature_type(long_name):
         return "pos"
     return "intercept"
 
+# The text searched by the /values endpoint: the lowercased name without its 
+#   "Word:" or "POS Pair:" prefix.
+def create_search_name(long_name):
+    return long_name.split(":")[-1].lower()
+
 # Creates and stores a table describing model coefficients.
-def populate_coef_data(clf, con_out):   
-    _, feature_names = get_features(clf)
+def populate_coef_data(clf, features, con_out):   
+    _, feature_names = features
     coef_list = clf.named_steps["model"].coef_[0]
     feature_type = [determine_feature_type(name[1]) for name in feature_names]
 
@@ -107,13 +137,22 @@ def populate_coef_data(clf, con_out):
         "short_name": [name[0] for name in feature_names],
         "long_name": [name[1] for name in feature_names],
         "value": coef_list,
-        "feature_type": feature_type
+        "feature_type": feature_type,
+        "abs_value": np.abs(coef_list),
+        "search_name": [create_search_name(name[1]) for name in feature_names]
     })
-    coef_df.to_sql("coefs", con_out, index=False, if_exists="replace")
+    write_frame(con_out, "coefs", coef_df, [
+        ("short_name", "TEXT"), ("long_name", "TEXT"), ("value", "REAL"), 
+        ("feature_type", "TEXT"), ("abs_value", "REAL"), ("search_name", "TEXT")
+    ])
+    return coef_df
 
 # Creates and stores a table describing feature contributions for individual radio addresses. 
-def populate_contrib_data(clf, data, con_out):
-    support_indices, feature_names = get_features(clf)
+# If contrib_dir is given, the contributions are also written there as memory-mappable
+#   arrays that index into a features table (see contrib_arrays.py), along with 
+#   snapshots of coef_df and of each speech's contributions for the plots.
+def populate_contrib_data(clf, features, data, con_out, contrib_dir=None, coef_df=None):
+    support_indices, feature_names = features
 
     speech_pipeline = clf.named_steps["union"].get_params()["speech"]
     pos_pipeline = clf.named_steps["union"].get_params()["pos"]
@@ -128,25 +167,120 @@ def populate_contrib_data(clf, data, con_out):
     coef_matrix = diags([coef for coef in coef_list], offsets=0)
     contrib_matrix = selected_matrix * coef_matrix
 
-    tups = []
-    intercept = model.intercept_[0]
-    for i, speech_id in enumerate(data["id"]):
-        row = contrib_matrix[i, :].toarray()[0]
-        new_tups = [(speech_id, feature_names[j][0], feature_names[j][1], cont) 
-                     for j, cont in enumerate(row) if cont != 0]
-        new_tups.append((speech_id, "FIXED INTERCEPT", "FIXED INTERCEPT", intercept))
-        tups += new_tups
-
-    cols = ["speech_id", "short_name", "long_name", "value"]
-    contrib_df = pd.DataFrame(tups, columns=cols)
-
-    feature_type = [determine_feature_type(long_name)
-                    for long_name in contrib_df["long_name"]]
-    contrib_df.insert(4, "feature_type", feature_type)
-
-    contrib_df.to_sql("contribs", con_out, index=False, if_exists="replace")
+    # Pull the nonzero contributions straight out of the sparse structure.
+    contrib_matrix = csr_matrix(contrib_matrix)
+    contrib_matrix.eliminate_zeros()
+    contrib_matrix.sort_indices()
+    contribs = contrib_matrix.tocoo()
+
+    # Append one intercept row per speech, then stably sort by speech so that each
+    #   speech's features (in feature order) are followed by its intercept.
+    num_speeches = data.shape[0]
+    num_features = len(feature_names)
+    rows = np.concatenate([contribs.row, np.arange(num_speeches)])
+    cols = np.concatenate([contribs.col, np.repeat(num_features, num_speeches)])
+    values = np.concatenate([contribs.data, np.repeat(model.intercept_[0], num_speeches)])
+    order = np.argsort(rows, kind="mergesort")
+    rows, cols, values = rows[order], cols[order], values[order]
+
+    short_names = np.array([name[0] for name in feature_names] + ["FIXED INTERCEPT"], 
+                           dtype=object)
+    long_names = np.array([name[1] for name in feature_names] + ["FIXED INTERCEPT"], 
+                          dtype=object)
+    feature_types = np.array([determine_feature_type(long_name) for long_name in long_names],
+                             dtype=object)
+    search_names = np.array([create_search_name(long_name) for long_name in long_names],
+                            dtype=object)
+
+    contrib_df = pd.DataFrame({
+        "speech_id": np.asarray(data["id"])[rows],
+        "short_name": short_names[cols],
+        "long_name": long_names[cols],
+        "value": values,
+        "feature_type": feature_types[cols]
+    }, columns=["speech_id", "short_name", "long_name", "value", "feature_type"])
+
+    # The magnitude and search text are stored for the game server's /values endpoint,
+    #   which reads a speech's rows by speech_id when no contribution arrays exist.
+    write_table(con_out, "contribs", [
+        ("speech_id", "INTEGER"), ("short_name", "TEXT"), ("long_name", "TEXT"), 
+        ("value", "REAL"), ("feature_type", "TEXT"), ("abs_value", "REAL"), 
+        ("search_name", "TEXT")
+    ], zip(
+        contrib_df["speech_id"].tolist(),
+        contrib_df["short_name"].tolist(),
+        contrib_df["long_name"].tolist(),
+        contrib_df["value"].tolist(),
+        contrib_df["feature_type"].tolist(),
+        np.abs(values).tolist(),
+        search_names[cols].tolist()
+    ), indexes=[("contribs_speech", ["speech_id"])])
+
+    if contrib_dir is not None:
+        if not os.path.isdir(contrib_dir):
+            os.makedirs(contrib_dir)
+        previous_version = get_contrib_version(con_out)
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=num_speeches))])
+        def write_snapshots(path):
+            if coef_df is not None:
+                populate_snapshots(coef_df, contrib_df, os.path.join(path, "snapshots"))
+        version = write_contrib_arrays(contrib_dir, data["id"], indptr, cols, values,
+                                       write_snapshots)
+
+        # The features the arrays index into and the name of the arrays' version are 
+        #   committed together, so readers never pair one with the other's old copy.
+        #   The server serves the snapshots of the same version.
+        write_tables(con_out, [
+            ("features", [
+                ("feature_index", "INTEGER PRIMARY KEY"), ("short_name", "TEXT"), 
+                ("long_name", "TEXT"), ("feature_type", "TEXT"), ("search_name", "TEXT")
+            ], zip(range(len(long_names)), short_names.tolist(), long_names.tolist(), 
+                   feature_types.tolist(), search_names.tolist()), []),
+            ("contrib_arrays", [("version", "TEXT")], [(version,)], [])
+        ])
+        remove_old_versions(contrib_dir, [version, previous_version])
     return contrib_df
 
+def get_contrib_version(con):
+    try:
+        return con.execute("SELECT version FROM contrib_arrays").fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        return None
+
+# Writes the names and values of a set of features, along with their rankings in 
+#   each order and feature type offered by the plots, as gzip'd JSON. The plots 
+#   fetch this once and page through it without asking the server again.
+def write_snapshot(path, feature_df):
+    values = np.round(np.asarray(feature_df["value"], dtype=np.float32).astype(float), 7)
+    magnitudes = np.abs(values)
+    feature_types = np.asarray(feature_df["feature_type"])
+    rankings = {
+        "descMag": np.argsort(-magnitudes, kind="mergesort"),
+        "ascMag": np.argsort(magnitudes, kind="mergesort"),
+        "descVal": np.argsort(-values, kind="mergesort"),
+        "ascVal": np.argsort(values, kind="mergesort")
+    }
+    orders = dict([(order, {
+        "all": ranking.tolist(),
+        "word": ranking[feature_types[ranking] == "word"].tolist(),
+        "pos": ranking[feature_types[ranking] == "pos"].tolist()
+    }) for order, ranking in rankings.items()])
+
+    snapshot = {"names": list(feature_df["long_name"]),
+                "values": values.tolist(),
+                "orders": orders}
+    with gzip.open(path, "wb") as f:
+        f.write(json.dumps(snapshot, separators=(",", ":")))
+
+# Writes a snapshot of the coefficients and one of the contributions of each speech
+#   into a version folder that write_contrib_arrays has not yet published.
+def populate_snapshots(coef_df, contrib_df, directory):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    write_snapshot(os.path.join(directory, "coefs.json.gz"), coef_df)
+    for speech_id, speech_df in contrib_df.groupby("speech_id"):
+        write_snapshot(os.path.join(directory, "contribs_%d.json.gz" % speech_id), speech_df)
+
 # Removes first and last sentence of a radio address.
 def strip_greetings(speech):
     speech = speech.replace("Ft.", "Ft").replace("U.S.", "US") # Avoids errors in sentence tokenizing.
@@ -155,53 +289,56 @@ def strip_greetings(speech):
     stripped = re.sub(exp, "", speech)
     return stripped.strip()
 
-# Selects the feature that had the largest contribution towards prediction. 
-def choose_top_feature(speech_id, predicted, contrib_df):
-    cond_one = contrib_df["speech_id"] == speech_id
-    cond_two = contrib_df["feature_type"] != "intercept"
-    current_values = contrib_df[cond_one & cond_two]                
-
-    if predicted: 
-        current_values = current_values.sort("value", ascending=False).reset_index()
-    else: 
-        current_values = current_values.sort("value").reset_index()
-
-    return (current_values["short_name"][0], current_values["feature_type"][0])
-
+# Selects, for every speech at once, the feature that had the largest contribution 
+#   towards its prediction. Returns a dictionary from speech id to (short_name, feature_type).
+def choose_top_features(contrib_df, speech_ids, predicted):
+    features = contrib_df[contrib_df["feature_type"] != "intercept"]
+
+    # Flip the sign for speeches predicted to be Bush so that idxmax finds the most
+    #   negative contribution for them and the most positive one for Obama.
+    direction = pd.Series([1 if prediction else -1 for prediction in predicted], 
+                          index=list(speech_ids))
+    signed_values = features["value"] * features["speech_id"].map(direction).values
+    top_rows = features.loc[signed_values.groupby(features["speech_id"]).idxmax().values]
+
+    return dict(zip(top_rows["speech_id"], 
+                    zip(top_rows["short_name"], top_rows["feature_type"])))
+
+HAS_LETTER = re.compile("[a-zA-Z]")
+YEAR = re.compile("(?<=[^0-9])20[0-1][0-9](?=[^0-9])")
+
+# Finds the character ranges of every occurrence of the given word pairs, merging 
+#   ranges that overlap. All pairs are matched by one pattern whose lookahead lets 
+#   overlapping occurrences be found in a single scan of the speech.
+def find_word_pair_spans(stripped, word_tuples):
+    alternatives = sorted(set(["".join([word_tup[0], "[^a-zA-Z\n]*", word_tup[1]])
+                               for word_tup in word_tuples]), key=len, reverse=True)
+    exp = re.compile("".join(["(?:^|(?<=[^a-zA-Z]))(?=(?P<word_pair>",
+                              "|".join(alternatives),
+                              ")(?:[^a-zA-Z]|$))"]))
+    spans = []
+    for new_range in [m.span("word_pair") for m in exp.finditer(stripped)]:
+        if spans and new_range[0] < spans[-1][1]:
+            spans[-1] = (spans[-1][0], max(spans[-1][1], new_range[1]))
+        else: 
+            spans.append(new_range)
+    return spans
 
 # Adds html span tags for displaying highlighting.
 # Years between 2000 and 2019 are replaced with **** after tags are added.
-def add_spans(speech_info, contrib_df):
-    stripped, speech_id, predicted = speech_info
+def add_spans(speech_info, feature, tagged=None):
+    stripped, speech_id = speech_info
     print "Adding spans to speech " + str(speech_id) + "..."
-    
-    feature = choose_top_feature(speech_id, predicted, contrib_df)
 
     if feature[1] == "pos":
         pos_pair = feature[0]
-        tagged_words = [tagged for tagged in pos_tag(word_tokenize(stripped))
-                        if re.findall("[a-zA-Z]", tagged[1])]
+        if tagged is None:
+            tagged = tag_texts([stripped], TagCache(), processes=1)[0]
+        tagged_words = [pair for pair in tagged if HAS_LETTER.search(pair[1])]
         tagged_bigrams = zip(tagged_words[:-1], tagged_words[1:])
         word_tuples = [(bigram[0][0], bigram[1][0]) for bigram in tagged_bigrams
                        if " ".join((bigram[0][1], bigram[1][1]))==pos_pair]
-
-        ranges = []
-        for word_tup in word_tuples:
-            exp = "".join(["(^|[^a-zA-Z])(?P<word_pair>",
-                           word_tup[0],
-                           "[^a-zA-Z\n]*",
-                           word_tup[1],
-                           ")([^a-zA-Z]|$)"])
-            matches = re.finditer(exp, stripped)
-            ranges += [m.span("word_pair") for m in matches]
-        
-        spans = []
-        ranges.sort()
-        for new_range in ranges:
-            if spans and new_range[0] < spans[-1][1]:
-                spans[-1] = (spans[-1][0], new_range[1])
-            else: 
-                spans.append(new_range)
+        spans = find_word_pair_spans(stripped, word_tuples) if word_tuples else []
 
     else: 
         word = feature[0]
@@ -209,26 +346,35 @@ def add_spans(speech_info, contrib_df):
         matches = re.finditer(exp, stripped, flags = re.IGNORECASE)
         spans = [m.span("w") for m in matches]
 
-    spans.sort(reverse=True)
+    # Build the highlighted speech in a single pass over the sorted spans.
+    pieces = []
+    last = 0
     for span in spans:
-        stripped = "".join([
-            stripped[0:span[0]], 
-            '<span class="highlight">', 
-            stripped[span[0]:span[1]], 
-            "</span>",
-            stripped[span[1]:]
-        ])
+        pieces += [stripped[last:span[0]], 
+                   '<span class="highlight">', 
+                   stripped[span[0]:span[1]], 
+                   "</span>"]
+        last = span[1]
+    pieces.append(stripped[last:])
 
-    exp = "(?<=[^0-9])20[0-1][0-9](?=[^0-9])"
-    return re.sub(exp, "****", stripped)
+    return YEAR.sub("****", "".join(pieces))
 
 # Creates and stores a database that saves radio addresses split into paragraphs.
 #  These are modified to be ready for use in flask app. 
 def populate_paragraphs(clf, data, contrib_df, con_out):
     stripped_speeches = [strip_greetings(speech) for speech in data["speech"]]
     predicted = clf.predict(data)
-    classy_speeches = [add_spans(triple, contrib_df) for triple in 
-                       zip(stripped_speeches, data["id"], predicted)]
+    top_features = choose_top_features(contrib_df, data["id"], predicted)
+    features = [top_features[speech_id] for speech_id in data["id"]]
+
+    # Only speeches highlighted by a part of speech pair need to be tagged.
+    tag_cache = TagCache()
+    tagged_speeches = tag_texts([stripped if feature[1] == "pos" else None
+                                 for stripped, feature in zip(stripped_speeches, features)],
+                                tag_cache)
+    tag_cache.close()
+    classy_speeches = [add_spans(pair, feature, tagged) for pair, feature, tagged in 
+                       zip(zip(stripped_speeches, data["id"]), features, tagged_speeches)]
 
     par_lists = [speech.split("\n\n") for speech in classy_speeches]
     tups = [(par, speech_tup[1], i)
@@ -245,7 +391,24 @@ def populate_paragraphs(clf, data, contrib_df, con_out):
     })
 
     paragraphs = pd.merge(paragraphs, speaker_info, on="speech_id")
-    paragraphs.to_sql("paragraphs", con_out, index=False, if_exists="replace")
+    write_frame(con_out, "paragraphs", paragraphs, [
+        ("par", "TEXT"), ("speech_id", "INTEGER"), ("par_id", "INTEGER"), 
+        ("predicted", "TEXT"), ("observed", "TEXT")
+    ], indexes=[("paragraphs_speech", ["speech_id", "par_id"])])
+
+    # One row per speech holding everything the game page needs, including the 
+    #   transcript already rendered as html, so a page is a single primary key lookup.
+    num_contributors = contrib_df.groupby("speech_id").size()
+    write_table(con_out, "speeches", [
+        ("id", "INTEGER PRIMARY KEY"), ("predicted", "TEXT"), ("observed", "TEXT"),
+        ("n_contributors", "INTEGER"), ("body", "TEXT")
+    ], [
+        (int(speech_id), predicted, observed, int(num_contributors.get(speech_id, 0)),
+         "\n".join(["<p> " + par + " </p>" for par in pars]))
+        for speech_id, predicted, observed, pars in 
+        zip(speaker_info["speech_id"], speaker_info["predicted"], 
+            speaker_info["observed"], par_lists)
+    ])
     
 if __name__ == '__main__':
     try: 
@@ -256,11 +419,19 @@ if __name__ == '__main__':
         sys.exit("\nExecution failed: incorrect usage.")
 
     con_in = sqlite3.connect(input_database_name)
-    con_out = sqlite3.connect(output_database_name)
+    con_out = connect(output_database_name)
 
-    clf = load_clf("../model_files/final_model.pkl")
+    model_file = "../model_files/final_model.pkl"
+    clf = load_clf(model_file)
+    features = load_features(clf, model_file)
     data = get_data(con_in)
-    populate_coef_data(clf, con_out)
-    contrib_df = populate_contrib_data(clf, data, con_out)
+    # The game reads contribution arrays and serves snapshots from a folder next to
+    #   its database.
+    output_dir = os.path.dirname(os.path.abspath(output_database_name))
+
+    coef_df = populate_coef_data(clf, features, con_out)
+    contrib_df = populate_contrib_data(clf, features, data, con_out, 
+                                       os.path.join(output_dir, "contribs"), coef_df)
     populate_paragraphs(clf, data, contrib_df, con_out)
+    close(con_out)
 
@@ -0,0 +1,39 @@
+import re
+import inspect
+import hashlib
+from multiprocessing import Pool
+from nltk.tokenize.punkt import PunktSentenceTokenizer
+
+# The tokenizer holds no per-document state, so a single instance is shared.
+SENTENCE_TOKENIZER = PunktSentenceTokenizer()
+DIGITS = re.compile("[0-9]")
+POS_PUNCTUATION = re.compile(" [^a-zA-Z ]+")
+
+# Removes first sentence, last sentence, and all numbers.
+def process_speech(speech):
+    sentences = SENTENCE_TOKENIZER.tokenize(speech)
+    stripped = " ".join(sentences[1:-1])
+    return DIGITS.sub("", stripped)
+
+# Removes punctuation, first sentence, last sentence,
+#   and all sentences that have a tagging error.
+def process_pos(string_of_tags):
+    sentences = SENTENCE_TOKENIZER.tokenize(string_of_tags)
+    stripped = " ".join([sent for sent in sentences[1:-1]
+                         if "NONE" not in sent])
+    return POS_PUNCTUATION.sub("", stripped)
+
+# Applies both preprocessing steps across a process pool.
+def process_all(speeches, strings_of_tags, processes=None, chunksize=16):
+    pool = Pool(processes)
+    try:
+        processed_speeches = pool.map(process_speech, speeches, chunksize)
+        processed_pos = pool.map(process_pos, strings_of_tags, chunksize)
+    finally:
+        pool.close()
+        pool.join()
+    return processed_speeches, processed_pos
+
+# Changes whenever the code in this module changes, so stored results can be invalidated.
+def code_version():
+    return hashlib.sha1(inspect.getsource(inspect.getmodule(code_version))).hexdigest()
@@ -0,0 +1,88 @@
+import sqlite3
+
+# Opens a database tuned for bulk writes. In WAL mode readers keep seeing the last
+#   committed state while a table is rebuilt, and synchronous=NORMAL skips the fsync
+#   after every transaction, which WAL makes safe against corruption.
+def connect(database_name):
+    con = sqlite3.connect(database_name)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    return con
+
+# Replaces tables with the given rows in a single transaction. Each table's rows are
+#   written into name__new with executemany, which is then renamed over the old table
+#   and indexed before committing, so readers see either all of the old tables or all 
+#   of the new ones.
+# tables is a list of (name, columns, rows, indexes) tuples, where columns is a list of
+#   (name, type) pairs, e.g. ("id", "INTEGER PRIMARY KEY"), and indexes is a list of 
+#   (index name, list of column names) pairs.
+def write_tables(con, tables):
+    # Python 2's sqlite3 commits before every CREATE, DROP and ALTER statement unless
+    #   transactions are managed by hand.
+    isolation_level = con.isolation_level
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN")
+        for name, columns, rows, indexes in tables:
+            temp_name = name + "__new"
+            definition = ", ".join(["%s %s" % column for column in columns])
+            placeholders = ", ".join(["?"]*len(columns))
+            con.execute("DROP TABLE IF EXISTS %s" % temp_name)
+            con.execute("CREATE TABLE %s (%s)" % (temp_name, definition))
+            con.executemany("INSERT INTO %s VALUES (%s)" % (temp_name, placeholders), rows)
+            con.execute("DROP TABLE IF EXISTS %s" % name)
+            con.execute("ALTER TABLE %s RENAME TO %s" % (temp_name, name))
+            for index_name, index_columns in indexes:
+                con.execute("CREATE INDEX %s ON %s (%s)" % (index_name, name,
+                                                           ", ".join(index_columns)))
+        con.execute("COMMIT")
+    except:
+        try:
+            con.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        raise
+    finally:
+        con.isolation_level = isolation_level
+
+def write_table(con, name, columns, rows, indexes=()):
+    write_tables(con, [(name, columns, rows, indexes)])
+
+# Renames a fully written table over another one in a single transaction.
+def replace_table(con, temp_name, name):
+    isolation_level = con.isolation_level
+    con.isolation_level = None
+    try:
+        con.execute("BEGIN")
+        con.execute("DROP TABLE IF EXISTS %s" % name)
+        con.execute("ALTER TABLE %s RENAME TO %s" % (temp_name, name))
+        con.execute("COMMIT")
+    except:
+        try:
+            con.execute("ROLLBACK")
+        except sqlite3.OperationalError:
+            pass
+        raise
+    finally:
+        con.isolation_level = isolation_level
+
+# Moves everything in the write-ahead log into the database file before closing, so
+#   the database file alone holds every table (e.g. when it is copied elsewhere).
+def close(con):
+    con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    con.close()
+
+CONVERTERS = {"INTEGER": int, "REAL": float}
+
+# Writes the given columns of a DataFrame with write_table. Values are converted to
+#   the plain Python types of their columns, since sqlite3 cannot bind numpy scalars.
+def write_frame(con, name, frame, columns, indexes=()):
+    values = []
+    for column_name, column_type in columns:
+        convert = CONVERTERS.get(column_type.split()[0])
+        column_values = list(frame[column_name])
+        if convert is not None:
+            column_values = [None if value is None else convert(value)
+                             for value in column_values]
+        values.append(column_values)
+    write_table(con, name, columns, zip(*values), indexes)
@@ -0,0 +1,77 @@
+import os
+import json
+import sqlite3
+import hashlib
+from multiprocessing import Pool
+from nltk import word_tokenize, pos_tag
+
+# Shared by make_data.py and populate_game_database.py so tags are reused across scripts.
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  "..", "tag_cache.db")
+
+def text_hash(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+# Tokenizes a text and tags each token with its part of speech.
+def tag_text(text):
+    return pos_tag(word_tokenize(text))
+
+# Persists tagged texts in SQLite keyed by the sha1 of the text.
+class TagCache(object):
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self._con = sqlite3.connect(path)
+        self._con.execute("CREATE TABLE IF NOT EXISTS tags (hash TEXT PRIMARY KEY, pairs TEXT)")
+        self._con.commit()
+
+    def get_many(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        # Stay below SQLite's limit on the number of query parameters.
+        for i in range(0, len(hashes), 500):
+            chunk = hashes[i:i + 500]
+            command = "SELECT hash, pairs FROM tags WHERE hash IN (%s)" % ",".join("?"*len(chunk))
+            for key, pairs in self._con.execute(command, chunk):
+                found[key] = [tuple(pair) for pair in json.loads(pairs)]
+        return found
+
+    def put_many(self, items):
+        self._con.executemany("INSERT OR REPLACE INTO tags VALUES (?, ?)",
+                              [(key, json.dumps(pairs)) for key, pairs in items])
+        self._con.commit()
+
+    def close(self):
+        self._con.close()
+
+# Tags a list of texts, returning a list of (word, tag) pairs for each one
+#   (or None for empty texts). Texts found in the cache are never tagged again, and
+#   the rest are tagged in chunks over a process pool and written back as they finish.
+def tag_texts(texts, cache=None, processes=None, chunksize=4):
+    keys = [text_hash(text) if text else None for text in texts]
+    unique = dict([(key, text) for key, text in zip(keys, texts) if key])
+    tagged = cache.get_many(unique.keys()) if cache else {}
+
+    pending = [(key, text) for key, text in unique.items() if key not in tagged]
+    if pending:
+        pending_texts = [text for _, text in pending]
+        pool = None
+        if processes != 1 and len(pending) > 1:
+            pool = Pool(processes)
+            results = pool.imap(tag_text, pending_texts, chunksize)
+        else:
+            results = (tag_text(text) for text in pending_texts)
+
+        finished = []
+        for (key, _), pairs in zip(pending, results):
+            tagged[key] = pairs
+            finished.append((key, pairs))
+            if cache and len(finished) >= 50:
+                cache.put_many(finished)
+                finished = []
+        if cache and finished:
+            cache.put_many(finished)
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return [tagged[key] if key else None for key in keys]
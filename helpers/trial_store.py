@@ -0,0 +1,46 @@
+import json
+import time
+
+# Records every trial of the hyperparameter search in SQLite as soon as it finishes,
+#   so that a crashed or interrupted search can be resumed.
+class TrialStore(object):
+    def __init__(self, con):
+        self.con = con
+        self.con.execute(" ".join([
+            "CREATE TABLE IF NOT EXISTS search_trials (",
+            "trial_id INTEGER PRIMARY KEY AUTOINCREMENT, param_list TEXT, param_dict TEXT,",
+            "fold_scores TEXT, mean_score REAL, sem REAL, seconds REAL, pruned INTEGER,",
+            "created REAL)"
+        ]))
+        self.con.commit()
+
+    def record(self, param_list, param_dict, scores, mean_score, sem, seconds, pruned):
+        self.con.execute(" ".join([
+            "INSERT INTO search_trials",
+            "(param_list, param_dict, fold_scores, mean_score, sem, seconds, pruned, created)",
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        ]), (json.dumps([float(value) for value in param_list]),
+             json.dumps(param_dict, sort_keys=True),
+             json.dumps([float(score) for score in scores]),
+             float(mean_score), float(sem), seconds, int(pruned), time.time()))
+        self.con.commit()
+
+    # Returns stored trials in the order they finished.
+    def load(self):
+        rows = self.con.execute(" ".join([
+            "SELECT param_list, fold_scores, mean_score, sem, seconds, pruned",
+            "FROM search_trials ORDER BY trial_id"
+        ])).fetchall()
+        return [{"param_list": json.loads(row[0]),
+                 "scores": json.loads(row[1]),
+                 "mean_score": row[2],
+                 "sem": row[3],
+                 "seconds": row[4],
+                 "pruned": bool(row[5])} for row in rows]
+
+    def count(self):
+        return self.con.execute("SELECT COUNT(*) FROM search_trials").fetchone()[0]
+
+    def clear(self):
+        self.con.execute("DELETE FROM search_trials")
+        self.con.commit()
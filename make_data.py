@@ -1,28 +1,34 @@
 
 
 import re
-import requests
-import sqlite3
+import hashlib
+import itertools
 import sys
-import pandas as pd
+import argparse
 from bs4 import BeautifulSoup
-from nltk import word_tokenize, pos_tag
 from dateutil.parser import parse
 
+from helpers.fetcher import Fetcher
+from helpers.http_cache import ResponseCache
+from helpers.storage import connect, replace_table
+from helpers.tagger import TagCache, tag_texts
 
-def get_obama_speeches():
+OBAMA_BASE_URL = "https://www.whitehouse.gov"
+BUSH_BASE_URL = "http://georgewbush-whitehouse.archives.gov"
+
+# Returns a list of (transcript url, raw title, raw date) for Obama's radio addresses.
+def get_obama_listings(fetcher, base_url=OBAMA_BASE_URL):
     # Start with pages that list the radio addresses.
-    initial_urls = ["https://www.whitehouse.gov/briefing-room/weekly-address?page="
-                    + str(i) for i in range(33)]
+    initial_urls = [base_url + "/briefing-room/weekly-address?page=" + str(i)
+                    for i in range(33)]
 
     # Obtain links to pages hosting transcripts for individual radio addresses.
     # Also create lists of titles and dates matching these links.
     transcript_urls = []
     titles = []
     dates = []
-    base_url = "https://www.whitehouse.gov"
-    for url in initial_urls: 
-        soup = BeautifulSoup(requests.get(url).text, "lxml")
+    for page in fetcher.fetch_all(initial_urls):
+        soup = BeautifulSoup(page, "lxml")
         div_of_links = soup("div", {"class": "view-content"})[-1]      
         a_tags = [a_tag for a_tag in div_of_links("a", href=True)]
         transcript_urls += [base_url + a_tag["href"] for a_tag in a_tags]
@@ -31,25 +37,22 @@ def get_obama_speeches():
                    for long_title in long_titles]
         dates += [span.get_text() for span in div_of_links("span")]  
 
-    # Download text from transcripts.
-    speeches = []
-    transcript_class = {"class": "field-name-field-transcript"}
-    for url in transcript_urls:
-        speech_soup = BeautifulSoup(requests.get(url).text, "lxml")
-        transcript_divs = [div for div in speech_soup("div", transcript_class)] 
-        content = transcript_divs[0].get_text()
-        speeches.append(content) 
+    return zip(transcript_urls, titles, dates)
 
-    return speeches, titles, dates
+def parse_obama_transcript(page, url):
+    speech_soup = BeautifulSoup(page, "lxml")
+    transcript_class = {"class": "field-name-field-transcript"}
+    transcript_divs = [div for div in speech_soup("div", transcript_class)] 
+    return transcript_divs[0].get_text()
 
-def get_bush_speeches():
+# Returns a list of (transcript url, raw title, raw date) for Bush's radio addresses.
+def get_bush_listings(fetcher, base_url=BUSH_BASE_URL):
     # Start with the single page that lists all the radio addresses.
-    initial_url = "http://georgewbush-whitehouse.archives.gov/news/radio/"
+    initial_url = base_url + "/news/radio/"
 
     # Obtain links to pages hosting transcripts for individual radio addresses. 
-    soup = BeautifulSoup(requests.get(initial_url).text, "html5lib")  
+    soup = BeautifulSoup(fetcher.fetch(initial_url), "html5lib")  
     table_of_links = soup("table", {"class": "archive"})[0]
-    base_url = "http://georgewbush-whitehouse.archives.gov"  
     transcript_urls = [base_url + a_tag["href"] 
                        for a_tag in table_of_links("a", href=True)]
 
@@ -65,42 +68,46 @@ def get_bush_speeches():
             dates.append(tds[0].get_text() + year)
             titles.append(tds[1].get_text())
 
-    # Download text from transcripts.
-    speeches = []
-    for url in transcript_urls: 
-        speech_soup = BeautifulSoup(requests.get(url).text, "lxml")
-        transcript_divs = speech_soup("div", {"id": "news_container"})
-        try:
-            div_with_paragraphs = transcript_divs[0]
-        except IndexError:
-            speeches.append(None)
-            print "Failed to locate transcript from the following url:", url
-            continue
-        paragraphs = []
-        for tag in div_with_paragraphs.contents:
-            if tag.name == "p":
-                paragraphs.append(tag.get_text())
-            elif tag.name is None:
-                # This only occurs when the tag is actually just text. 
-                paragraphs.append(unicode(tag)) 
-        speeches.append(paragraphs)
-
-    return speeches, titles, dates
+    return zip(transcript_urls, titles, dates)
+
+def parse_bush_transcript(page, url):
+    speech_soup = BeautifulSoup(page, "lxml")
+    transcript_divs = speech_soup("div", {"id": "news_container"})
+    try:
+        div_with_paragraphs = transcript_divs[0]
+    except IndexError:
+        print "Failed to locate transcript from the following url:", url
+        return None
+    paragraphs = []
+    for tag in div_with_paragraphs.contents:
+        if tag.name == "p":
+            paragraphs.append(tag.get_text())
+        elif tag.name is None:
+            # This only occurs when the tag is actually just text. 
+            paragraphs.append(unicode(tag)) 
+    return paragraphs
      
+# Unicode symbols and the ascii text that replaces them.
+UNICODE_VOCAB = {"-": [u"\u2013"],
+                 "--": [u"\u2014", u"\u2015"], 
+                 "'": [u"\u2018", u"\u2019", u"\u201b", u"\u201c", 
+                       u"\u201d", u"\u2032"],
+                 ",": [u"\u201a"],  
+                 "/": [u"\u2044"],
+                 "...": [u"\u2026"], 
+                 " ": [u"\xa0", u"\t", u"\r"], 
+                 "n": [u"\xf1"]}
+
+# Translation table so that every symbol is replaced in a single pass.
+UNICODE_TABLE = dict([(ord(code), unicode(char)) 
+                      for char, codes in UNICODE_VOCAB.items() for code in codes])
+
+HAS_LETTER = re.compile("[a-zA-Z]")
+SPEAKER_INTRO = re.compile("PRESIDENT: *|BUSH: *")
+SPEECH_END = re.compile("[^\.\!\?]*END")
+
 def translate_from_unicode(text):
-    unicode_vocab = {"-": [u"\u2013"],
-                     "--": [u"\u2014", u"\u2015"], 
-                     "'": [u"\u2018", u"\u2019", u"\u201b", u"\u201c", 
-                           u"\u201d", u"\u2032"],
-                     ",": [u"\u201a"],  
-                     "/": [u"\u2044"],
-                     "...": [u"\u2026"], 
-                     " ": [u"\xa0", u"\t", u"\r"], 
-                     "n": [u"\xf1"]}
-    for char, codes in unicode_vocab.items():
-        for code in codes:
-            text = text.replace(code, char)
-    return str(text)
+    return str(unicode(text).translate(UNICODE_TABLE))
 
 def remove_extra_spaces(text):
     return " ".join(text.split())
@@ -122,7 +129,7 @@ def extract_obama_speech(content):
     # Also remove extra whitespace because it's no longer needed after splitting.
     lines = [remove_extra_spaces(line) 
              for line in chunk.splitlines() 
-             if re.search("[a-zA-Z]", line)]
+             if HAS_LETTER.search(line)]
 
     # Skip intro text by finding the first line of the speech header.
     i = 0
@@ -150,13 +157,13 @@ def extract_bush_speech(paragraphs):
     # Start by replacing unicode symbols and removing extra whitespace.
     lines = [remove_extra_spaces(translate_from_unicode(p)) 
              for p in paragraphs 
-             if re.search("[a-zA-Z]", p)]
+             if HAS_LETTER.search(p)]
 
     # Combine all lines that occur after Bush begins speaking.
     try:
         # Bush is usually introduced in one of two ways.
         merged = "\n\n".join(lines)
-        chunk = re.split("PRESIDENT: *|BUSH: *", merged)[1]
+        chunk = SPEAKER_INTRO.split(merged)[1]
     except IndexError:
         # If Bush isn't introduced nicely, skip the header by starting
         #   at the first line that has enough words to really be a paragraph.
@@ -166,7 +173,7 @@ def extract_bush_speech(paragraphs):
         chunk = "\n\n".join(lines[i:])
 
     # Remove all text that occurs after Bush stops speaking.
-    chunk = re.split("[^\.\!\?]*END", chunk)[0]
+    chunk = SPEECH_END.split(chunk)[0]
 
     # Return None if radio address was given by Laura Bush.
     if "Laura Bush" in chunk:
@@ -177,10 +184,15 @@ def extract_bush_speech(paragraphs):
 
 # Translates each word in a speech to its part of speech.
 def translate_to_pos(speech):
-    if not speech:
-        return None
-    pos_pairs = pos_tag(word_tokenize(speech))
-    return " ".join([pair[1] for pair in pos_pairs])
+    return translate_all_to_pos([speech], processes=1)[0]
+
+# Translates a list of speeches in parallel, reusing cached tags where possible.
+def translate_all_to_pos(speeches, processes=None):
+    cache = TagCache()
+    tagged_speeches = tag_texts(speeches, cache, processes=processes)
+    cache.close()
+    return [" ".join([pair[1] for pair in pos_pairs]) if pos_pairs else None
+            for pos_pairs in tagged_speeches]
 
 def extract_title(text):
     return remove_extra_spaces(translate_from_unicode(text))
@@ -189,43 +201,182 @@ def extract_date(text):
     dt = parse(translate_from_unicode(text))
     return str(dt.date())
 
-def download_process_store(database_name):
-    print "Downloading Obama's radio addresses..."
-    raw_obama_speeches, raw_obama_titles, raw_obama_dates = get_obama_speeches()
-
-    print "Downloading Bush's radio addresses..."
-    raw_bush_speeches, raw_bush_titles, raw_bush_dates = get_bush_speeches()
-
-    print "Extracting and cleaning... "
-    obama_speeches = [extract_obama_speech(raw_speech)
-                      for raw_speech in raw_obama_speeches]
-    bush_speeches = [extract_bush_speech(raw_speech) 
-                      for raw_speech in raw_bush_speeches]                    
-    speeches = obama_speeches + bush_speeches
-    pos = [translate_to_pos(speech) for speech in speeches]
-    titles = [extract_title(raw_title) 
-              for raw_title in raw_obama_titles + raw_bush_titles]
-    dates = [extract_date(raw_date) for raw_date in raw_obama_dates + raw_bush_dates]
-    speakers = ["obama"]*len(obama_speeches) + ["bush"]*len(bush_speeches)
-
-    print "Storing..."
-    addresses = pd.DataFrame({"speech": speeches,
-                              "pos": pos, 
-                              "title": titles, 
-                              "date": dates, 
-                              "speaker": speakers})
-    addresses = addresses.drop_duplicates(subset="speech").dropna(axis=0)
-    addresses["id"] = range(addresses.shape[0])
-    con = sqlite3.connect(database_name)
-    addresses.to_sql("radio_addresses", con, index=False, if_exists="replace")
+def compute_hash(speech):
+    return hashlib.sha1(speech.encode("utf-8")).hexdigest()
+
+def table_exists(con, table_name):
+    command = "SELECT COUNT(*) FROM sqlite_master WHERE type='table' AND name=?"
+    return con.execute(command, (table_name,)).fetchone()[0] > 0
+
+# Full rebuilds are stored in this table, which replaces radio_addresses only once
+#   every radio address has been stored.
+BUILD_TABLE = "radio_addresses__new"
+
+# Adds the url and content_hash columns to tables built before incremental mode existed.
+def upgrade_addresses_table(con, table="radio_addresses"):
+    columns = [row[1] for row in con.execute("PRAGMA table_info(%s)" % table)]
+    if "url" not in columns:
+        con.execute("ALTER TABLE %s ADD COLUMN url TEXT" % table)
+    if "content_hash" not in columns:
+        con.execute("ALTER TABLE %s ADD COLUMN content_hash TEXT" % table)
+        rows = con.execute("SELECT id, speech FROM %s" % table).fetchall()
+        con.executemany("UPDATE %s SET content_hash=? WHERE id=?" % table,
+                        [(compute_hash(speech), row_id) for row_id, speech in rows])
+    con.commit()
+
+# Collects urls, (speaker, date) pairs, and content hashes of stored radio addresses, 
+#   along with the next unused id.
+def get_known_addresses(con, table="radio_addresses"):
+    if not table_exists(con, table):
+        return set(), set(), set(), 0
+    upgrade_addresses_table(con, table)
+    rows = con.execute(
+        "SELECT url, speaker, date, content_hash FROM %s" % table
+    ).fetchall()
+    known_urls = set([row[0] for row in rows if row[0]])
+    known_dates = set([(row[1], row[2]) for row in rows])
+    known_hashes = set([row[3] for row in rows])
+    next_id = con.execute("SELECT COALESCE(MAX(id) + 1, 0) FROM %s" % table).fetchone()[0]
+    return known_urls, known_dates, known_hashes, next_id
+
+# Keeps listings whose url and date don't match a stored radio address. 
+# Dates are also compared since tables built before urls were stored only have dates.
+def select_new_listings(listings, speaker, known_urls, known_dates):
+    return [listing for listing in listings
+            if listing[0] not in known_urls
+            and (speaker, extract_date(listing[2])) not in known_dates]
+
+def create_addresses_table(con, table="radio_addresses"):
+    con.execute("DROP TABLE IF EXISTS %s" % table)
+    con.execute(" ".join([
+        "CREATE TABLE %s (" % table,
+        "id INTEGER PRIMARY KEY, date TEXT, title TEXT, speaker TEXT,",
+        "speech TEXT, pos TEXT, url TEXT, content_hash TEXT)"
+    ]))
+    con.commit()
+
+# Downloads transcripts one window at a time and yields each radio address 
+#   as soon as it has been extracted and cleaned.
+def iter_addresses(fetcher, listings, speaker, window=50):
+    parse_transcript, extract_speech = {
+        "obama": (parse_obama_transcript, extract_obama_speech),
+        "bush": (parse_bush_transcript, extract_bush_speech)
+    }[speaker]
+    for i in range(0, len(listings), window):
+        chunk = listings[i:i + window]
+        pages = fetcher.fetch_all([listing[0] for listing in chunk])
+        for (url, raw_title, raw_date), page in zip(chunk, pages):
+            speech = extract_speech(parse_transcript(page, url))
+            if not speech:
+                continue
+            yield {"speech": speech,
+                   "title": extract_title(raw_title),
+                   "date": extract_date(raw_date),
+                   "speaker": speaker,
+                   "url": url}
+
+# Skips radio addresses whose content hash was already stored or seen earlier in the stream.
+def drop_duplicates(addresses, known_hashes):
+    for address in addresses:
+        address["content_hash"] = compute_hash(address["speech"])
+        if address["content_hash"] not in known_hashes:
+            known_hashes.add(address["content_hash"])
+            yield address
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# Tags a batch of radio addresses and inserts them in a single transaction.
+def store_batch(con, batch, first_id, table="radio_addresses"):
+    pos = translate_all_to_pos([address["speech"] for address in batch])
+    rows = [(first_id + i, address["date"], address["title"], address["speaker"],
+             address["speech"], tags, address["url"], address["content_hash"])
+            for i, (address, tags) in enumerate(zip(batch, pos))]
+    with con:
+        con.executemany(" ".join([
+            "INSERT INTO %s" % table,
+            "(id, date, title, speaker, speech, pos, url, content_hash)",
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        ]), rows)
+
+def download_process_store(database_name, incremental=False, cache_dir=None, 
+                           cache_only=False, max_cache_mb=500, batch_size=50):
+    con = connect(database_name)
+    # A full rebuild is stored in BUILD_TABLE so the existing table survives a failure.
+    #   Rerunning with --incremental resumes an interrupted rebuild.
+    if incremental and table_exists(con, BUILD_TABLE):
+        print "Resuming an interrupted rebuild..."
+        table = BUILD_TABLE
+    elif incremental and table_exists(con, "radio_addresses"):
+        table = "radio_addresses"
+    else: 
+        table = BUILD_TABLE
+        create_addresses_table(con, table)
+    known_urls, known_dates, known_hashes, next_id = get_known_addresses(con, table)
+
+    cache = None
+    if cache_dir:
+        cache = ResponseCache(cache_dir, max_bytes=max_cache_mb*2**20, offline=cache_only)
+    fetcher = Fetcher(cache=cache)
+
+    print "Downloading lists of radio addresses..."
+    obama_listings = select_new_listings(get_obama_listings(fetcher), "obama", 
+                                         known_urls, known_dates)
+    bush_listings = select_new_listings(get_bush_listings(fetcher), "bush", 
+                                        known_urls, known_dates)
+    if incremental:
+        print "Found %d new radio addresses." % (len(obama_listings) + len(bush_listings))
+
+    # Each radio address flows through downloading, cleaning, tagging, and storing 
+    #   without the whole corpus ever being held in memory. Every batch is committed 
+    #   on its own, so rerunning with --incremental picks up where a crash left off.
+    print "Downloading, cleaning, tagging, and storing radio addresses..."
+    addresses = itertools.chain(iter_addresses(fetcher, obama_listings, "obama", batch_size),
+                                iter_addresses(fetcher, bush_listings, "bush", batch_size))
+    num_stored = 0
+    for batch in iter_batches(drop_duplicates(addresses, known_hashes), batch_size):
+        store_batch(con, batch, next_id + num_stored, table)
+        num_stored += len(batch)
+        print "Stored %d radio addresses..." % num_stored
+
+    print "Downloaded %d pages (%.1f pages/sec, %d served from cache)." % (
+        fetcher.num_pages, fetcher.pages_per_second(), fetcher.num_cached)
+    fetcher.close()
+    if table == BUILD_TABLE:
+        replace_table(con, BUILD_TABLE, "radio_addresses")
+    con.close()
 
 if __name__ == '__main__':
-    try: 
-        database_name = sys.argv[1]
-    except IndexError:
-        print "usage: make_data.py database_name"
-        sys.exit("\nExecution failed: user must provide location for sql database.")
-    download_process_store(database_name)
+    parser = argparse.ArgumentParser(description="Scrape, clean, and store radio addresses.")
+    parser.add_argument("database_name", help="location for sql database")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch and store radio addresses missing from the database")
+    parser.add_argument("--batch-size", type=int, default=50,
+                        help="number of radio addresses tagged and stored per transaction")
+    parser.add_argument("--cache-dir", default="http_cache",
+                        help="directory for cached pages (default: http_cache)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always download pages without caching them")
+    parser.add_argument("--cache-only", action="store_true",
+                        help="never touch the network, only replay cached pages")
+    parser.add_argument("--max-cache-mb", type=int, default=500,
+                        help="size limit for cached pages in megabytes (default: 500)")
+    args = parser.parse_args()
+    if args.no_cache and args.cache_only:
+        sys.exit("\nExecution failed: --no-cache and --cache-only can't be combined.")
+    download_process_store(args.database_name, 
+                           incremental=args.incremental,
+                           cache_dir=None if args.no_cache else args.cache_dir,
+                           cache_only=args.cache_only, 
+                           max_cache_mb=args.max_cache_mb,
+                           batch_size=args.batch_size)
     
         
 
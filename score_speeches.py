@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from collections import deque
+from multiprocessing import Pool
+
+from helpers.compact_model import CompactScorer, speaker_label
+from helpers.preprocessing import process_speech, process_pos
+from helpers.tagger import TagCache, tag_texts
+
+# Yields (id, speech, pos) from a file with one JSON object per line.
+# Each object needs "id" and "speech" keys, and may include a "pos" translation.
+def read_jsonl(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["id"], record["speech"], record.get("pos")
+
+# Yields (file name, speech, None) for every .txt file in a directory.
+def read_text_dir(path):
+    for file_name in sorted(os.listdir(path)):
+        if file_name.endswith(".txt"):
+            with open(os.path.join(path, file_name)) as f:
+                yield file_name, f.read().decode("utf-8"), None
+
+# Yields (id, speech, pos) from a table with id and speech columns, and optionally pos.
+def read_sqlite(database_name, table):
+    con = sqlite3.connect(database_name)
+    columns = [row[1] for row in con.execute("PRAGMA table_info(%s)" % table)]
+    pos_column = "pos" if "pos" in columns else "NULL"
+    command = "SELECT id, speech, %s FROM %s ORDER BY id" % (pos_column, table)
+    for row in con.execute(command):
+        yield row
+    con.close()
+
+def iter_batches(items, batch_size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# The scorer is loaded once per worker process by init_worker.
+worker_state = {}
+
+def init_worker(model_file):
+    worker_state["scorer"] = CompactScorer(model_file)
+
+# Tags speeches that lack a part of speech translation, preprocesses them like the
+#   training data, and scores the whole batch with one sparse matrix product.
+def score_batch(batch):
+    ids, speeches, pos = zip(*batch)
+    untagged = [i for i, tags in enumerate(pos) if not tags]
+    pos = list(pos)
+    if untagged:
+        cache = TagCache()
+        tagged = tag_texts([speeches[i] for i in untagged], cache, processes=1)
+        cache.close()
+        for i, pairs in zip(untagged, tagged):
+            pos[i] = " ".join([pair[1] for pair in pairs]) if pairs else ""
+
+    documents = [{"processed_speech": process_speech(speech),
+                  "processed_pos": process_pos(tags)}
+                 for speech, tags in zip(speeches, pos)]
+    decisions = worker_state["scorer"].decision_function(documents)
+    return [(speech_id, speaker_label(decision), float(decision))
+            for speech_id, decision in zip(ids, decisions)]
+
+# Scores batches across worker processes while keeping a bounded number of batches
+#   in flight, so memory stays flat no matter how large the input is.
+def score_stream(records, model_file, output, processes=None, batch_size=64):
+    pool = Pool(processes, initializer=init_worker, initargs=(model_file,))
+    max_in_flight = 2*(processes or os.sysconf("SC_NPROCESSORS_ONLN"))
+    in_flight = deque()
+    num_scored = 0
+    start = time.time()
+
+    def write_results(results):
+        for speech_id, predicted, decision in results:
+            output.write(json.dumps({"id": speech_id, "predicted": predicted,
+                                     "decision": decision}) + "\n")
+        return len(results)
+
+    for batch in iter_batches(records, batch_size):
+        in_flight.append(pool.apply_async(score_batch, (batch,)))
+        if len(in_flight) >= max_in_flight:
+            num_scored += write_results(in_flight.popleft().get())
+    while in_flight:
+        num_scored += write_results(in_flight.popleft().get())
+
+    pool.close()
+    pool.join()
+    seconds = time.time() - start
+    sys.stderr.write("Scored %d documents in %.1f seconds (%.1f docs/sec).\n" % (
+        num_scored, seconds, num_scored/seconds if seconds else 0.0))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Predict the speaker of transcripts, writing one JSON line per document.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--jsonl", help="file with one {\"id\", \"speech\", \"pos\"} object per line")
+    source.add_argument("--text-dir", help="directory of .txt transcripts")
+    source.add_argument("--sqlite", help="database with a table of transcripts")
+    parser.add_argument("--table", default="radio_addresses",
+                        help="table to read with --sqlite (default: radio_addresses)")
+    parser.add_argument("--model", default="model_files/final_model.npz",
+                        help="compact model file (default: model_files/final_model.npz)")
+    parser.add_argument("--output", help="file for predictions (default: standard output)")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument("--batch-size", type=int, default=64,
+                        help="number of documents scored per batch (default: 64)")
+    args = parser.parse_args()
+
+    if args.jsonl:
+        records = read_jsonl(args.jsonl)
+    elif args.text_dir:
+        records = read_text_dir(args.text_dir)
+    else:
+        records = read_sqlite(args.sqlite, args.table)
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    score_stream(records, args.model, output, args.processes, args.batch_size)
+    if args.output:
+        output.close()
@@ -1,13 +1,18 @@
 import sqlite3
-import re
-import sys
+import time
+import numbers
+import pickle
+import resource
+import argparse
+import inspect
+import hashlib
 import pandas as pd
 import numpy as np
-from nltk.tokenize.punkt import PunktSentenceTokenizer
+from multiprocessing import Pool, Process, Queue
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.svm import LinearSVC
-from sklearn.cross_validation import cross_val_score, train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.cross_validation import cross_val_score, train_test_split, StratifiedKFold
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
 from sklearn.metrics import precision_score, recall_score, accuracy_score, f1_score
 from sklearn.pipeline import Pipeline, FeatureUnion
 from sklearn.feature_selection import chi2, SelectKBest
@@ -16,33 +21,64 @@ from moe.easy_interface.experiment import Experiment
 from moe.easy_interface.simple_endpoint import gp_next_points
 from moe.optimal_learning.python.data_containers import SamplePoint
 
-# Removes first sentence, last sentence, and all numbers.
-def process_speech(speech):
-    sentences = PunktSentenceTokenizer().tokenize(speech)
-    stripped = " ".join(sentences[1:-1])
-    return re.sub("[0-9]", "", stripped)
-
-# Removes punctuation, first sentence, last sentence, 
-#   and all sentences that have a tagging error.
-def process_pos(string_of_tags):
-    sentences = PunktSentenceTokenizer().tokenize(string_of_tags)
-    stripped = " ".join([sent for sent in sentences[1:-1] 
-                         if "NONE" not in sent])
-    return re.sub(" [^a-zA-Z ]+", "", stripped) 
+from helpers.compact_model import export_compact_model
+from helpers.feature_cache import FeatureCache
+from helpers.local_gp import LocalGP
+from helpers.preprocessing import process_all, code_version
+from helpers.storage import connect, write_frame, write_table
+from helpers.trial_store import TrialStore
 
 def get_and_clean_data(con):
     from_sql = pd.read_sql("SELECT id, speech, pos, speaker FROM radio_addresses", con)
+    processed_speech, processed_pos = process_all(list(from_sql["speech"]), 
+                                                  list(from_sql["pos"]))
     data = pd.DataFrame({
         "id": from_sql["id"],
-        "processed_speech": [process_speech(speech) 
-                   for speech in from_sql["speech"]],
-        "processed_pos": [process_pos(string_of_tags) 
-                for string_of_tags in from_sql["pos"]],
+        "processed_speech": processed_speech,
+        "processed_pos": processed_pos,
         "speaker_num": [1 if speaker == "obama" else 0 
                         for speaker in from_sql["speaker"]]
     })
     return data
 
+# Identifies the raw data and the code used to process and split it.
+def compute_data_key(con):
+    key = hashlib.sha1(code_version())
+    key.update(inspect.getsource(split_data))
+    key.update(repr(DATA_COLUMNS))
+    rows = con.execute("SELECT id, speech, pos, speaker FROM radio_addresses ORDER BY id")
+    for row in rows:
+        key.update(repr(row))
+    return key.hexdigest()
+
+def get_stored_key(con):
+    try:
+        return con.execute("SELECT key FROM data_version").fetchone()[0]
+    except (sqlite3.OperationalError, TypeError):
+        return None
+
+# id is a plain column rather than the rowid, so the rows keep the shuffled order of
+#   train_test_split and reused splits give the same cross validation folds.
+DATA_COLUMNS = [("id", "INTEGER"), ("processed_speech", "TEXT"),
+                ("processed_pos", "TEXT"), ("speaker_num", "INTEGER")]
+
+# Reuses data_train and data_test if they were built from the same raw data and code.
+# Otherwise, processes and splits the raw data again and stores the result.
+def get_split_data(con):
+    key = compute_data_key(con)
+    if get_stored_key(con) == key:
+        print "Reusing stored training and testing data..."
+        data_train = pd.read_sql("SELECT * FROM data_train ORDER BY rowid", con)
+        data_test = pd.read_sql("SELECT * FROM data_test ORDER BY rowid", con)
+        return data_train, data_test
+
+    data = get_and_clean_data(con)
+    data_train, data_test = split_data(data)
+    write_frame(con, "data_train", data_train, DATA_COLUMNS)
+    write_frame(con, "data_test", data_test, DATA_COLUMNS)
+    write_table(con, "data_version", [("key", "TEXT")], [(key,)])
+    return data_train, data_test
+
 def split_data(data):
     train, test = train_test_split(data, test_size=0.3, random_state=512)
     data_train = pd.DataFrame(train, columns=data.columns)
@@ -65,24 +101,68 @@ class ItemSelector(BaseEstimator, TransformerMixin):
 def pos_tokenizer(string_of_tags):
     return string_of_tags.split()
 
+# Keeps the columns of a count matrix whose document frequency lies between min_df and
+#   max_df, given as proportions of documents (floats) or counts (integers) like the
+#   options of TfidfVectorizer. Columns that no document uses are always dropped.
+class DfFilter(BaseEstimator, TransformerMixin):
+    def __init__(self, min_df=1, max_df=1.0):
+        self.min_df = min_df
+        self.max_df = max_df
+
+    def fit(self, x, y=None):
+        num_docs = x.shape[0]
+        df = np.bincount(x.tocsr().indices, minlength=x.shape[1])
+        min_count = self.min_df if isinstance(self.min_df, numbers.Integral) else self.min_df*num_docs
+        max_count = self.max_df if isinstance(self.max_df, numbers.Integral) else self.max_df*num_docs
+        self.columns_ = np.flatnonzero((df >= max(min_count, 1)) & (df <= max_count))
+        return self
+
+    def transform(self, x):
+        return x.tocsc()[:, self.columns_].tocsr()
+
+# Number of columns the hashing vectorizers map terms into before DfFilter drops the
+#   unused ones.
+HASH_FEATURES = 2**20
+
 # Defines a classifier based on a list describing a set of hyperparameters. 
-def create_model(param_list):
+# With hashing, terms are hashed into columns instead of being stored in a vocabulary, 
+#   and the document frequency filter and idf weights are fitted as separate steps.
+def create_model(param_list, hashing=False):
     # Define two pipelines that will be used as building blocks. 
-    speech_pipeline = Pipeline([
-        ("prepare", ItemSelector("processed_speech")),           
-        ("create", TfidfVectorizer(stop_words="english"))
-    ])
-    pos_pipeline = Pipeline([
-        ("prepare", ItemSelector("processed_pos")),
-        ("create", TfidfVectorizer(use_idf=False, lowercase=False,
-                                   tokenizer=pos_tokenizer))
-    ])
+    if hashing:
+        speech_pipeline = Pipeline([
+            ("prepare", ItemSelector("processed_speech")),
+            ("create", HashingVectorizer(stop_words="english", n_features=HASH_FEATURES,
+                                         non_negative=True, norm=None)),
+            ("filter", DfFilter()),
+            ("weight", TfidfTransformer())
+        ])
+        pos_pipeline = Pipeline([
+            ("prepare", ItemSelector("processed_pos")),
+            ("create", HashingVectorizer(lowercase=False, tokenizer=pos_tokenizer,
+                                         n_features=HASH_FEATURES, non_negative=True,
+                                         norm=None)),
+            ("filter", DfFilter()),
+            ("weight", TfidfTransformer(use_idf=False))
+        ])
+        df_step = "filter"
+    else:
+        speech_pipeline = Pipeline([
+            ("prepare", ItemSelector("processed_speech")),           
+            ("create", TfidfVectorizer(stop_words="english"))
+        ])
+        pos_pipeline = Pipeline([
+            ("prepare", ItemSelector("processed_pos")),
+            ("create", TfidfVectorizer(use_idf=False, lowercase=False,
+                                       tokenizer=pos_tokenizer))
+        ])
+        df_step = "create"
 
     # Start a dictionary of hyperparameters. 
     param_dict = {
         'union__speech__create__ngram_range': (1, round_to_int(param_list[0])), 
-        'union__speech__create__max_df': param_list[1],
-        'union__speech__create__min_df': param_list[2],
+        'union__speech__%s__max_df' % df_step: param_list[1],
+        'union__speech__%s__min_df' % df_step: param_list[2],
         'select__k': round_to_int(param_list[3]),
         'model__C': param_list[4],
     }
@@ -92,7 +172,7 @@ def create_model(param_list):
     if round_to_int(param_list[5]): 
         feature_list.append(("pos", pos_pipeline))
         param_dict['union__pos__create__ngram_range'] = (2, round_to_int(param_list[6]))
-        param_dict['union__pos__create__min_df'] = param_list[7]
+        param_dict['union__pos__%s__min_df' % df_step] = param_list[7]
         
     # Define classifier and set its hyperparameters. 
     clf = Pipeline([
@@ -105,16 +185,63 @@ def create_model(param_list):
     # Return hyperparameter dictionary and tuned model. 
     return param_dict, clf
 
+# Scores the given folds of 10-fold cross validation (all of them by default).
+def cross_validate(clf, data_train, targets_train, feature_cache=None, n_jobs=-1, 
+                   fold_indices=None):
+    if feature_cache is not None:
+        return feature_cache.cross_val_score(clf, fold_indices)
+    cv = 10
+    if fold_indices is not None:
+        folds = list(StratifiedKFold(targets_train, n_folds=10))
+        cv = [folds[i] for i in fold_indices]
+    return cross_val_score(clf, data_train, targets_train, 
+                           scoring="f1", cv=cv, n_jobs=n_jobs)
+
 # Computes F1 scores from 10-fold cross validation.
-def score_model(clf, data_train, targets_train):
+# Passing a FeatureCache reuses token counts instead of refitting the vectorizers per fold.
+def score_model(clf, data_train, targets_train, feature_cache=None, n_jobs=-1):
     try: 
-        return cross_val_score(clf, data_train, targets_train, 
-                               scoring="f1", cv=10, n_jobs=-1)
+        return cross_validate(clf, data_train, targets_train, feature_cache, n_jobs)
     except: 
         # Fitting these models can fail when k in SelectKBest is set too big.
         clf.set_params(select__k="all") 
-        return cross_val_score(clf, data_train, targets_train, 
-                               scoring="f1", cv=10, n_jobs=-1)
+        return cross_validate(clf, data_train, targets_train, feature_cache, n_jobs)
+
+# Numbers of folds after which a candidate may be pruned, and the number of earlier
+#   candidates that must reach a checkpoint before anything is pruned there.
+PRUNING_RUNGS = [3, 6]
+MIN_TRIALS_TO_PRUNE = 5
+
+def score_folds_with_pruning(clf, data_train, targets_train, rung_history, 
+                             feature_cache=None, n_jobs=-1):
+    scores = []
+    rung_means = []
+    for start, stop in zip([0] + PRUNING_RUNGS, PRUNING_RUNGS + [10]):
+        scores += list(cross_validate(clf, data_train, targets_train, feature_cache, 
+                                      n_jobs, range(start, stop)))
+        if stop == 10:
+            break
+        mean_score = np.mean(scores)
+        rung_means.append(mean_score)
+        previous = rung_history.get(stop, [])
+        if len(previous) >= MIN_TRIALS_TO_PRUNE and mean_score < np.median(previous):
+            return np.array(scores), rung_means, True
+    return np.array(scores), rung_means, False
+
+# Computes F1 scores from 10-fold cross validation, but stops early if the mean score
+#   after 3 or 6 folds is below the median of earlier candidates at the same point.
+# Returns the scores computed so far, the mean score at each checkpoint reached, and 
+#   whether the candidate was pruned.
+def score_model_with_pruning(clf, data_train, targets_train, rung_history, 
+                             feature_cache=None, n_jobs=-1):
+    try: 
+        return score_folds_with_pruning(clf, data_train, targets_train, rung_history,
+                                        feature_cache, n_jobs)
+    except: 
+        # Fitting these models can fail when k in SelectKBest is set too big.
+        clf.set_params(select__k="all") 
+        return score_folds_with_pruning(clf, data_train, targets_train, rung_history,
+                                        feature_cache, n_jobs)
 
 def compute_SEM(scores):
     return np.std(scores)/np.sqrt(len(scores))
@@ -124,73 +251,262 @@ def objective(score, status_quo):
     # Follow MOE's guidelines to define a good objective function.
     return -1*(score/status_quo - 1)
 
+# Defines the range of each hyperparameter. 
+SEARCH_DOMAIN = [
+    [1, 2],         # max of ngram range (gets rounded to nearest integer)
+    [.7, 1],        # max_df for ngrams
+    [0, .1],        # min_df for ngrams
+    [250, 2000],    # maximum number of features (gets rounded to nearest integer)
+    [.01, 100],     # regularization parameter
+    [0, 1],         # include parts of speech features if and only if value is >= .5
+    [2, 3],         # max of ngram range for parts of speech (gets rounded to nearest integer)
+    [0, .1]         # min_df for ngrams from parts of speech
+]
+
+# Data shared with candidate evaluations, set once per process by init_evaluation.
+evaluation_state = {}
+
+def init_evaluation(data_train, targets_train, feature_cache, n_jobs, prune, hashing=False):
+    evaluation_state.update({
+        "data_train": data_train,
+        "targets_train": targets_train,
+        "feature_cache": feature_cache,
+        "n_jobs": n_jobs,
+        "prune": prune,
+        "hashing": hashing
+    })
+
+# Builds and cross validates the model described by a list of hyperparameters.
+# The rung history holds mean scores of earlier candidates for pruning.
+def evaluate_candidate(candidate):
+    param_list, rung_history = candidate
+    start = time.time()
+    state = evaluation_state
+    param_dict, clf = create_model(param_list, state["hashing"])
+    if state["prune"]:
+        scores, rung_means, pruned = score_model_with_pruning(
+            clf, state["data_train"], state["targets_train"], rung_history,
+            state["feature_cache"], state["n_jobs"]
+        )
+    else: 
+        scores = score_model(clf, state["data_train"], state["targets_train"],
+                             state["feature_cache"], state["n_jobs"])
+        rung_means, pruned = [], False
+    return param_list, param_dict, scores, rung_means, pruned, time.time() - start
+
+# Seeds the search with the trials stored by earlier runs.
+def load_previous_trials(trial_store, status_quo, exp, search_results, rung_history,
+                         hashing=False):
+    sample_points = []
+    for trial in trial_store.load():
+        scores = trial["scores"]
+        param_dict, _ = create_model(trial["param_list"], hashing)
+        search_results.append(
+            (trial["param_list"], param_dict, trial["mean_score"], trial["sem"], trial["pruned"])
+        )
+        for rung in PRUNING_RUNGS:
+            if len(scores) >= rung:
+                rung_history.setdefault(rung, []).append(np.mean(scores[:rung]))
+        objectives = [objective(score, status_quo) for score in scores]
+        sample_points.append(
+            SamplePoint(trial["param_list"], np.mean(objectives), np.var(objectives))
+        )
+    if sample_points:
+        exp.historical_data.append_sample_points(sample_points)
+    print "Resuming from %d stored trials." % len(sample_points)
+    return len(sample_points)
+
+# Asks MOE for the next points to sample, falling back on a local Gaussian process
+#   with constant liar batching if the MOE server can't be reached.
+def propose_points(exp, num_points, local_gp):
+    try:
+        return gp_next_points(exp, num_to_sample=num_points)
+    except IOError:
+        # MOE talks to its server with urllib2, whose errors are IOErrors.
+        print "MOE server unavailable, proposing points with a local Gaussian process..."
+        historical_data = exp.historical_data
+        return local_gp.next_points(historical_data.points_sampled,
+                                    historical_data.points_sampled_value,
+                                    num_points)
+
 # Implements a Bayesian hyperparameter search and records stats for each resulting model.
-def search_models(status_quo, data_train, targets_train):
-    # Define the range of each hyperparameter. 
-    exp = Experiment([
-        [1, 2],         # max of ngram range (gets rounded to nearest integer)
-        [.7, 1],        # max_df for ngrams
-        [0, .1],        # min_df for ngrams
-        [250, 2000],    # maximum number of features (gets rounded to nearest integer)
-        [.01, 100],     # regularization parameter
-        [0, 1],         # include parts of speech features if and only if value is >= .5
-        [2, 3],         # max of ngram range for parts of speech (gets rounded to nearest integer)
-        [0, .1]         # min_df for ngrams from parts of speech
-    ])
+# Each round proposes batch_size points, which are evaluated concurrently in a process 
+#   pool when batch_size is larger than one. Every trial is written to the trial store 
+#   as it finishes, and only hyperparameters (not fitted models) are kept in memory.
+# num_rounds counts the whole search, so a resumed search only runs the rounds needed
+#   to bring the stored trials up to num_rounds*batch_size. Stored trials are deleted
+#   only if fresh is set.
+def search_models(status_quo, data_train, targets_train, trial_store, feature_cache=None,
+                  num_rounds=100, batch_size=1, pool_size=None, prune=False, resume=False,
+                  hashing=False, fresh=False):
+    exp = Experiment(SEARCH_DOMAIN)
+    local_gp = LocalGP(SEARCH_DOMAIN, random_state=512)
+
+    pool = None
+    if batch_size > 1:
+        # Workers score folds serially since they can't start their own processes.
+        pool = Pool(pool_size or batch_size, initializer=init_evaluation,
+                    initargs=(data_train, targets_train, feature_cache, 1, prune, hashing))
+    else: 
+        init_evaluation(data_train, targets_train, feature_cache, -1, prune, hashing)
 
     # Run the search. 
-    # Use 20 more iterations than the 80 suggested by MOE to compensate for lack of historical data. 
+    # By default, use 20 more iterations than the 80 suggested by MOE to compensate 
+    #   for lack of historical data. 
     search_results = []
-    for _ in range(100):
-        # Choose the next model based on results from previous models.
-        param_list = gp_next_points(exp)[0]
-        param_dict, clf  = create_model(param_list)
+    rung_history = {}
+    first_round = 0
+    if resume:
+        num_trials = load_previous_trials(trial_store, status_quo, exp, search_results,
+                                          rung_history, hashing)
+        first_round = min(-(-num_trials // batch_size), num_rounds)
+    elif fresh: 
+        trial_store.clear()
 
-        # Compute F1 scores using cross validation and save the result. 
-        scores = score_model(clf, data_train, targets_train)
-        mean_score = np.mean(scores)
-        search_results.append(
-            (clf, param_dict, mean_score, compute_SEM(scores))
-        )
+    for round_num in range(first_round, num_rounds):
+        start = time.time()
 
-        # Plug F1 scores into objective function and update historical data.
-        objectives = [objective(score, status_quo) for score in scores]
-        sample_point = SamplePoint(param_list, np.mean(objectives), np.var(objectives))
-        exp.historical_data.append_sample_points([sample_point])
+        # Choose the next models based on results from previous models.
+        param_lists = propose_points(exp, batch_size, local_gp)
+        # Trials are recorded in the order they finish, so a crash mid-batch only loses
+        #   the ones still being scored. The pool pickles candidates in the background
+        #   while rung_history grows, so each round hands out its own copy.
+        round_history = dict([(rung, list(means)) for rung, means in rung_history.items()])
+        candidates = [(param_list, round_history) for param_list in param_lists]
+        if pool is not None:
+            evaluations = pool.imap_unordered(evaluate_candidate, candidates)
+        else:
+            evaluations = (evaluate_candidate(candidate) for candidate in candidates)
+
+        sample_points = []
+        for param_list, param_dict, scores, rung_means, pruned, seconds in evaluations:
+            # Compute F1 scores using cross validation and save the result. 
+            mean_score = np.mean(scores)
+            SEM = compute_SEM(scores)
+            search_results.append((param_list, param_dict, mean_score, SEM, pruned))
+            trial_store.record(param_list, param_dict, scores, mean_score, SEM, seconds, pruned)
+            for rung, rung_mean in zip(PRUNING_RUNGS, rung_means):
+                rung_history.setdefault(rung, []).append(rung_mean)
+
+            # Plug F1 scores into objective function. 
+            objectives = [objective(score, status_quo) for score in scores]
+            sample_points.append(
+                SamplePoint(param_list, np.mean(objectives), np.var(objectives))
+            )
 
-        # Print most recent F1 score so that user can see progress. 
-        print "mean F1 score:", mean_score
+            # Print most recent F1 score so that user can see progress. 
+            if pruned:
+                print "mean F1 score: %s (pruned after %d folds)" % (mean_score, len(scores))
+            else:
+                print "mean F1 score:", mean_score
+
+        # Update historical data once the whole batch has been scored.
+        exp.historical_data.append_sample_points(sample_points)
+        print "Round %d of %d took %.1f seconds." % (round_num + 1, num_rounds, 
+                                                     time.time() - start)
+
+    if pool is not None:
+        pool.close()
+        pool.join()
 
     return search_results
 
 # Selects all models that scored within one standard error of the best score.
+# Pruned models are skipped since they weren't scored on every fold.
 def select_models(search_results):
+    search_results = [result for result in search_results if not result[4]]
     best_score = max([result[2] for result in search_results])
     SE = min([result[3] for result in search_results
               if result[2] == best_score])
     return [result for result in search_results
             if result[2] >= best_score - SE]
 
-def search_select_evaluate(database_name):
+# Resets the peak resident memory of this process, which Linux allows through 
+#   /proc/self/clear_refs.
+def reset_peak_memory():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except IOError:
+        pass
+
+# Returns the resident memory of this process and its peak since the last reset, in MB.
+def read_memory():
+    fields = {}
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:") or line.startswith("VmHWM:"):
+                    fields[line.split(":")[0]] = int(line.split()[1])/1024.0
+        return fields["VmRSS"], fields["VmHWM"]
+    except (IOError, KeyError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024.0
+        return peak, peak
+
+# Fits a model and reports the fit time, the extra memory used at the peak of fitting,
+#   and the size of the pickled model. Runs in its own process so that the memory 
+#   measurement only covers this fit.
+def measure_fit(clf, data_train, targets_train, queue):
+    reset_peak_memory()
+    baseline, _ = read_memory()
+    start = time.time()
+    clf.fit(data_train, targets_train)
+    seconds = time.time() - start
+    _, peak = read_memory()
+    model_size = len(pickle.dumps(clf, pickle.HIGHEST_PROTOCOL))/2.0**20
+    queue.put((seconds, peak - baseline, model_size))
+
+# Compares vocabulary-based and hashing feature extraction for one set of hyperparameters.
+def compare_feature_modes(param_list, data_train, targets_train, data_test, targets_test):
+    print "%-12s %10s %10s %12s %12s %12s" % (
+        "mode", "CV F1", "test F1", "fit seconds", "peak MB", "pickle MB")
+    for hashing in [False, True]:
+        _, clf = create_model(param_list, hashing)
+        scores = score_model(clf, data_train, targets_train)
+
+        queue = Queue()
+        process = Process(target=measure_fit, args=(clf, data_train, targets_train, queue))
+        process.start()
+        seconds, memory, model_size = queue.get()
+        process.join()
+
+        clf.fit(data_train, targets_train)
+        test_score = f1_score(targets_test, clf.predict(data_test))
+        print "%-12s %10.4f %10.4f %12.2f %12.1f %12.2f" % (
+            "hashing" if hashing else "vocabulary", np.mean(scores), test_score,
+            seconds, memory, model_size)
+
+def search_select_evaluate(database_name, cached_features=False, num_rounds=100, 
+                           batch_size=1, pool_size=None, prune=False, resume=False,
+                           hashing=False, compare_modes=False, fresh=False):
     print "Processing data..."
-    con = sqlite3.connect(database_name)
-    data = get_and_clean_data(con)
-    data_train, data_test = split_data(data)
+    con = connect(database_name)
+    trial_store = TrialStore(con)
+    if not (resume or fresh or compare_modes) and trial_store.count():
+        print "search_trials holds %d trials from an earlier search." % trial_store.count()
+        print "Rerun with --resume to continue it or --fresh to delete them."
+        return
+    data_train, data_test = get_split_data(con)
     targets_train = data_train["speaker_num"]
     targets_test = data_test["speaker_num"]
-    data_train.to_sql("data_train", con, index = False, if_exists="replace")
-    data_test.to_sql("data_test", con, index = False, if_exists="replace")
 
     print "Obtaining a 'status quo' model..."
     # Choose reasonable (but probably not perfect) hyperparameters. 
     param_list = [2, .85, .05, 1000, 1.0, 0, 2, 0] 
-    _, clf  = create_model(param_list)
-    scores = score_model(clf, data_train, targets_train)
+    if compare_modes:
+        print "Comparing feature extraction modes on the 'status quo' model..."
+        compare_feature_modes(param_list, data_train, targets_train, data_test, targets_test)
+        return
+    _, clf  = create_model(param_list, hashing)
+    feature_cache = FeatureCache(data_train, targets_train) if cached_features else None
+    scores = score_model(clf, data_train, targets_train, feature_cache)
     status_quo = np.mean(scores)
     print "Mean F1 score from cross validation of 'status quo' model:", status_quo
 
     print "Running hyperparameter search..."
-    search_results = search_models(status_quo, data_train, targets_train)
+    search_results = search_models(status_quo, data_train, targets_train, trial_store,
+                                   feature_cache, num_rounds, batch_size, pool_size, 
+                                   prune, resume, hashing, fresh)
     best_results = select_models(search_results)
 
     print "\nAll of the following models scored within one standard error of the best score:"
@@ -206,7 +522,7 @@ def search_select_evaluate(database_name):
 
     print "\nTraining and saving the selected model..."
     selected_index = int(selection)
-    clf = best_results[selected_index][0]
+    _, clf = create_model(best_results[selected_index][0], hashing)
     try: 
         clf.fit(data_train, targets_train)
     except: 
@@ -215,6 +531,11 @@ def search_select_evaluate(database_name):
         clf.fit(data_train, targets_train)
     joblib.dump(clf, "model_files/final_model.pkl")
     print "Model saved as 'final_model.pkl' in working directory with auxilary files."
+    if hashing:
+        print "Skipping the compact scoring model, which needs a vocabulary."
+    else:
+        export_compact_model(clf, "model_files/final_model.npz")
+        print "Compact scoring model saved as 'final_model.npz'."
 
     print "Evaluating model on testing set..."
     predicted = clf.predict(data_test)
@@ -225,9 +546,35 @@ def search_select_evaluate(database_name):
     
 
 if __name__ == '__main__':
-    try: 
-        database_name = sys.argv[1]
-    except IndexError:
-        print "usage: select_model.py database_name"
-        sys.exit("\nExecution failed: user must provide location of sql database.")
-    search_select_evaluate(database_name)
+    parser = argparse.ArgumentParser(description="Search for, select, and evaluate a model.")
+    parser.add_argument("database_name", help="location of sql database")
+    parser.add_argument("--cached-features", action="store_true",
+                        help="tokenize the training data once and reuse the counts in every fold")
+    parser.add_argument("--rounds", type=int, default=100,
+                        help="number of rounds in the hyperparameter search, including "
+                             "rounds resumed with --resume (default: 100)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="number of models proposed and scored per round (default: 1)")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="number of processes scoring models (default: batch size)")
+    parser.add_argument("--prune", action="store_true",
+                        help="stop scoring models that fall below the median after 3 or 6 folds")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the search from the trials stored in the database")
+    parser.add_argument("--fresh", action="store_true",
+                        help="delete the trials stored in the database and start a new search")
+    parser.add_argument("--hashing", action="store_true",
+                        help="hash terms into columns instead of keeping vocabularies")
+    parser.add_argument("--compare-modes", action="store_true",
+                        help="compare fit time, memory, and model size with and without "
+                             "hashing on the 'status quo' model, then exit")
+    args = parser.parse_args()
+    if args.hashing and args.cached_features:
+        parser.error("--cached-features can't be combined with --hashing")
+    if args.resume and args.fresh:
+        parser.error("--resume can't be combined with --fresh")
+    search_select_evaluate(args.database_name, cached_features=args.cached_features,
+                           num_rounds=args.rounds, batch_size=args.batch_size, 
+                           pool_size=args.pool_size, prune=args.prune, 
+                           resume=args.resume, hashing=args.hashing,
+                           compare_modes=args.compare_modes, fresh=args.fresh)